@@ -0,0 +1,217 @@
+# benchmark.py
+# Đo hiệu năng các đường nóng: hash, đào, replace_chain, nhập theo chunk, to_list / export_jsonl.
+# Mỗi kết quả là 1 dòng JSON (JSON Lines) để so sánh giữa các lần chạy:
+#   python benchmark.py --out bench.jsonl
+#   python benchmark.py --only mine --difficulties 3 4 --workers 1 4 8
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+from block import Block, encode_payload
+from blockchain import Blockchain
+from chainio import CHUNK_BLOCKS, export_jsonl, import_blocks
+from difficulty import (
+    MAX_ADJUST,
+    TARGET_BLOCK_TIME,
+    difficulty_to_target,
+    target_to_bits,
+)
+from validation import warm_up as warm_up_validation
+
+DEFAULT_PAYLOAD_SIZES = [100, 10_000, 1_000_000]
+DEFAULT_DIFFICULTIES = [3, 4, 5]
+DEFAULT_WORKERS = sorted({1, os.cpu_count() or 1})
+DEFAULT_HEIGHTS = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def _payload(size, n_txs=1, seq=0):
+    # seq: TX khác nhau giữa các block (TX trùng / đã có trên chuỗi bị từ chối)
+    txs = [
+        {"from": "A", "to": "B", "amount": 1.0, "seq": f"{seq}.{i}",
+         "message": "x" * max(0, size // n_txs)}
+        for i in range(n_txs)
+    ]
+    # A là miner → thưởng mỗi block bù lại số đã chuyển, ledger không bao giờ âm
+    return encode_payload({"txs": txs, "miner": "A"})
+
+
+def _timed(fn, min_time):
+    """Gọi fn lặp lại đến khi đủ min_time giây, trả về (số lần, giây)."""
+    n, start = 0, time.perf_counter()
+    while True:
+        fn()
+        n += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return n, elapsed
+
+
+def bench_calculate_hash(payload_sizes, min_time):
+    for size in payload_sizes:
+        b = Block(1, time.time(), _payload(size), "00" * 32)
+        n, elapsed = _timed(b.calculate_hash, min_time)
+        yield {"bench": "calculate_hash", "payload_bytes": size,
+               "value": n / elapsed, "unit": "hash/s"}
+
+        # data_root chỉ tính 1 lần / block, nhưng tỉ lệ với kích thước data
+        def root():
+            b._data_root = None
+            return b.data_root
+        n, elapsed = _timed(root, min_time)
+        yield {"bench": "data_root", "payload_bytes": size,
+               "value": n / elapsed, "unit": "block/s"}
+
+
+def bench_mine(difficulties, payload_sizes, workers_list, min_time):
+    """
+    Đào liên tục trong min_time giây: tìm được nonce thì đào tiếp block mới (timestamp
+    khác), hết giờ thì cancel → hashrate không bị chi phối bởi chi phí khởi động 1 lần đào.
+    hashes = tổng số hash báo lần cuối (không throttle) của từng lần đào.
+    """
+    for difficulty in difficulties:
+        bits = target_to_bits(difficulty_to_target(difficulty))
+        for size in payload_sizes:
+            data = _payload(size)
+            # data_root không đổi giữa các block → tính 1 lần, không tính vào hashrate
+            root = Block(1, 0.0, data, "00" * 32).data_root
+            for workers in workers_list:
+                cancel = threading.Event()
+                timer = threading.Timer(min_time, cancel.set)
+                hashes = found = 0
+                start = time.perf_counter()
+                timer.start()
+                while not cancel.is_set():
+                    b = Block(1, time.time(), data, "00" * 32, bits=bits)
+                    b._data_root = root
+                    progress = []
+                    if b.mine(
+                        workers=workers if workers > 1 else None,
+                        cancel=cancel,
+                        progress=lambda h, r: progress.append(h),
+                    ):
+                        found += 1
+                    hashes += progress[-1] if progress else 0
+                elapsed = time.perf_counter() - start
+                timer.cancel()
+                yield {"bench": "mine",
+                       "difficulty": difficulty, "payload_bytes": size,
+                       "workers": workers, "found": found,
+                       "hashes": hashes, "seconds": elapsed,
+                       "value": hashes / elapsed if elapsed else 0.0, "unit": "hash/s"}
+
+
+def build_chain(height, progress=None):
+    """
+    Tạo chuỗi hợp lệ `height` block: khoảng cách timestamp = MAX_ADJUST * TARGET_BLOCK_TIME
+    nên retarget nhanh chóng về target dễ nhất, mỗi block chỉ cần vài hash.
+    Block cuối có timestamp ≈ hiện tại (timestamp ở tương lai bị từ chối khi kiểm tra).
+    """
+    bc = Blockchain()
+    ts = time.time() - height * MAX_ADJUST * TARGET_BLOCK_TIME
+    for i in range(height):
+        prev = bc.tip().hash if bc.tip() else None
+        b = Block(i, ts, _payload(100, seq=i), prev, bits=bc.next_bits())
+        b.mine()
+        bc.appendBlock(b)
+        ts += MAX_ADJUST * TARGET_BLOCK_TIME
+        if progress and i % 10_000 == 0:
+            progress(i)
+    return bc
+
+
+def _chain_of(blocks):
+    bc = Blockchain()
+    for b in blocks:
+        bc.appendBlock(b)
+    return bc
+
+
+def bench_chain(heights, build_progress=None):
+    source = build_chain(max(heights), build_progress)
+    full = source.to_list()
+    for height in sorted(heights):
+        dicts = full[:height]
+        sub = _chain_of(source.chains[:height])
+
+        start = time.perf_counter()
+        sub.to_list()
+        yield {"bench": "to_list", "height": height,
+               "value": time.perf_counter() - start, "unit": "s"}
+
+        start = time.perf_counter()
+        size = sum(len(part) for part in export_jsonl(sub))
+        yield {"bench": "export_jsonl", "height": height, "bytes": size,
+               "value": time.perf_counter() - start, "unit": "s"}
+
+        # node mới: nhận toàn bộ chuỗi
+        fresh = Blockchain()
+        start = time.perf_counter()
+        ok = fresh.replace_chain(dicts)
+        yield {"bench": "replace_chain_fresh", "height": height, "accepted": ok,
+               "value": time.perf_counter() - start, "unit": "s"}
+
+        # node mới sync qua mạng: nhận và nhập từng chunk CHUNK_BLOCKS block
+        fresh = Blockchain()
+        start = time.perf_counter()
+        import_blocks(fresh, dicts)
+        yield {"bench": "import_chunked", "height": height, "chunk": CHUNK_BLOCKS,
+               "accepted": fresh.height() == height,
+               "value": time.perf_counter() - start, "unit": "s"}
+
+        # sync định kỳ: peer gửi lại chuỗi ta đã có + 1 block mới
+        synced = _chain_of(source.chains[:height - 1])
+        start = time.perf_counter()
+        ok = synced.replace_chain(dicts)
+        yield {"bench": "replace_chain_one_new", "height": height, "accepted": ok,
+               "value": time.perf_counter() - start, "unit": "s"}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark hash / mine / chain")
+    ap.add_argument("--only", nargs="*",
+                    choices=["hash", "mine", "chain"],
+                    default=["hash", "mine", "chain"])
+    ap.add_argument("--payload-sizes", nargs="*", type=int, default=DEFAULT_PAYLOAD_SIZES)
+    ap.add_argument("--difficulties", nargs="*", type=int, default=DEFAULT_DIFFICULTIES)
+    ap.add_argument("--workers", nargs="*", type=int, default=DEFAULT_WORKERS)
+    ap.add_argument("--heights", nargs="*", type=int, default=DEFAULT_HEIGHTS)
+    ap.add_argument("--min-time", type=float, default=1.0,
+                    help="số giây tối thiểu cho mỗi phép đo hash/mine")
+    ap.add_argument("--out", help="ghi JSON Lines vào file (mặc định: stdout)")
+    args = ap.parse_args(argv)
+
+    out = open(args.out, "a", encoding="utf-8") if args.out else sys.stdout
+    meta = {
+        "run": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+    def emit(results):
+        for r in results:
+            out.write(json.dumps({**meta, **r}) + "\n")
+            out.flush()
+
+    def log_build(i):
+        print(f"[bench] build chain: {i} block", file=sys.stderr)
+
+    try:
+        if "hash" in args.only:
+            emit(bench_calculate_hash(args.payload_sizes, args.min_time))
+        if "mine" in args.only:
+            emit(bench_mine(args.difficulties, args.payload_sizes, args.workers, args.min_time))
+        if "chain" in args.only:
+            warm_up_validation()
+            emit(bench_chain(args.heights, log_build))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
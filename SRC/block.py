@@ -1,50 +1,315 @@
 # block.py
 import hashlib
+import json
+import struct
 import time
 
-DIFFICULTY = 3
+from difficulty import INITIAL_BITS, bits_to_target
+from merkle import encode_leaf, hash_leaf, merkle_proof, merkle_root, verify_proof
+from mining import NONCE, parallel_mine, serial_mine
+
+# Header nhị phân cố định (big-endian), nonce nằm cuối:
+#   index u64 | timestamp f64 | bits u32 | prev_hash 32B | data_root 32B | nonce u64
+HEADER_PREFIX = struct.Struct(">QdI32s32s")
+HEADER_SIZE = HEADER_PREFIX.size + NONCE.size
+# bản ghi đầy đủ trên dây / đĩa: header | độ dài data u32 | data utf-8
+DATA_LEN = struct.Struct(">I")
+ZERO_HASH = bytes(32)
+# kích thước tối đa của 1 block (bản ghi header | độ dài | data, xem record_size).
+# Trên dây block là 1 dòng JSON, data bị escape tối đa ~6× (\uXXXX) → vẫn dưới
+# chainio.CHUNK_BYTES và peer_net.MAX_FRAME_SIZE: block nào cũng vừa 1 frame.
+MAX_BLOCK_SIZE = 1024 * 1024
+
+
+def encode_payload(payload):
+    """Data chuẩn của block chứa TX (JSON sort key, không khoảng trắng) – mỗi payload đúng 1 chuỗi."""
+    return encode_leaf(payload).decode()
+
+
+def tx_budget(miner):
+    """
+    Số byte dành cho TX trong block lớn nhất của `miner` – mỗi TX tốn
+    len(encode_leaf(tx)) + 1 (dấu phẩy).
+    """
+    empty = encode_leaf({"txs": [], "miner": miner})
+    return MAX_BLOCK_SIZE - HEADER_SIZE - DATA_LEN.size - len(empty)
 
 
 class Block:
-    def __init__(self, index, timestamp, data, previous_hash, nonce=0):
+    # __slots__: không có __dict__ riêng cho mỗi block
+    __slots__ = (
+        "index",
+        "timestamp",
+        "data",
+        "previous_hash",
+        "bits",
+        "nonce",
+        "claimed_hash",
+        "_hash",
+        "_data_root",
+    )
+
+    def __init__(
+        self, index, timestamp, data, previous_hash, nonce=0, bits=INITIAL_BITS, claimed_hash=None
+    ):
         self.index = index
         self.timestamp = timestamp
         self.data = data
         self.previous_hash = previous_hash
+        self.bits = bits   # target PoW dạng compact, nằm trong header
         self.nonce = nonce
-        self.hash = self.calculate_hash()
+        # hash được tính lười (lần đầu truy cập)
+        self._hash = None
+        self._data_root = None
+        # hash do peer gửi kèm, chỉ dùng để đối chiếu
+        self.claimed_hash = claimed_hash
+
+    @property
+    def hash(self):
+        if self._hash is None:
+            self._hash = self.calculate_hash()
+        return self._hash
+
+    @hash.setter
+    def hash(self, value):
+        self._hash = value
+
+    @property
+    def data_root(self):
+        """Merkle root của data (32 byte) – header chỉ cam kết qua root này."""
+        if self._data_root is None:
+            self._data_root = merkle_root(self.merkle_leaves())
+        return self._data_root
+
+    def _split_payload(self):
+        """
+        payload {"txs": [...], "miner": ...} (block cũ: {"tx": ...})
+        → (phần còn lại của payload, list TX, key TX); data không phải payload → (None, [], None).
+        """
+        try:
+            payload = json.loads(self.data)
+        except (TypeError, ValueError):
+            return None, [], None
+        if not isinstance(payload, dict):
+            return None, [], None
+        if isinstance(payload.get("txs"), list):
+            key, txs = "txs", payload["txs"]
+        elif isinstance(payload.get("tx"), dict):
+            key, txs = "tx", [payload["tx"]]
+        else:
+            return None, [], None
+        rest = {k: v for k, v in payload.items() if k not in ("tx", "txs")}
+        return rest, txs, key
+
+    def transactions(self):
+        return self._split_payload()[1]
+
+    def miner(self):
+        rest = self._split_payload()[0]
+        return rest.get("miner") if rest else None
+
+    def data_ok(self):
+        """
+        data_root phải cam kết đúng từng byte data:
+          - payload TX phải đúng dạng chuẩn (encode_payload), không có cả "tx" lẫn "txs"
+          - data thô (không phải payload) không được là JSON object
+        Block chỉ có header (data=None) → True.
+        """
+        if self.data is None:
+            return True
+        if not isinstance(self.data, str):
+            return False
+        try:
+            payload = json.loads(self.data)
+        except ValueError:
+            return True
+        if not isinstance(payload, dict):
+            return True
+        if "tx" in payload and "txs" in payload:
+            return False
+        return self._split_payload()[0] is not None and self.data == encode_payload(payload)
+
+    def merkle_leaves(self):
+        """
+        Hash các lá: lá 0 = phần còn lại của payload (miner...), lá i+1 = TX thứ i.
+        Block cũ ({"tx": ...}) đánh dấu "tx" trong lá 0 để không trùng root với {"txs": [tx]}.
+        Data không phải payload TX → 1 lá duy nhất là toàn bộ data.
+        """
+        rest, txs, key = self._split_payload()
+        if rest is None:
+            return [hash_leaf(self.data.encode())]
+        if key == "tx":
+            rest = {**rest, "tx": 1}
+        return [hash_leaf(encode_leaf(rest))] + [hash_leaf(encode_leaf(tx)) for tx in txs]
+
+    def tx_proof(self, i):
+        """Proof Merkle cho TX thứ i, kiểm tra được chỉ với header (data_root)."""
+        return merkle_proof(self.merkle_leaves(), i + 1)
+
+    @staticmethod
+    def verify_tx(tx, proof, data_root):
+        """data_root: bytes hoặc hex lấy từ header."""
+        if isinstance(data_root, str):
+            data_root = bytes.fromhex(data_root)
+        return verify_proof(hash_leaf(encode_leaf(tx)), proof, data_root)
+
+    def header_prefix(self):
+        """Bytes của phần header cố định (không gồm nonce)."""
+        prev = bytes.fromhex(self.previous_hash) if self.previous_hash else ZERO_HASH
+        return HEADER_PREFIX.pack(self.index, self.timestamp, self.bits, prev, self.data_root)
+
+    def header_bytes(self):
+        return self.header_prefix() + NONCE.pack(self.nonce)
 
     def calculate_hash(self):
-        raw = f"{self.index}{self.timestamp}{self.data}{self.previous_hash}{self.nonce}"
-        return hashlib.sha256(raw.encode()).hexdigest()
+        """SHA-256 của header, luôn tính lại (`hash` chỉ tính lần đầu rồi giữ)."""
+        return hashlib.sha256(self.header_bytes()).hexdigest()
 
-    def mine(self, difficulty=DIFFICULTY):
-        prefix = "0" * difficulty
-        while True:
-            self.hash = self.calculate_hash()
-            if self.hash.startswith(prefix):
-                break
-            self.nonce += 1
+    def hash_matches_claim(self):
+        """Trust-but-verify: hash peer gửi (nếu có) phải khớp nội dung block."""
+        return self.claimed_hash is None or self.claimed_hash == self.hash
 
-    def to_dict(self):
-        return self.__dict__
+    def target(self):
+        return bits_to_target(self.bits)
+
+    def mine(self, workers=None, cancel=None, progress=None):
+        """
+        Tìm nonce sao cho hash < target (lấy từ self.bits).
+        workers=None: đào ngay trên thread hiện tại
+        cancel: token có is_set() (vd threading.Event) để dừng giữa chừng
+        progress: callback(hashes, hashrate) được gọi định kỳ
+        Trả về True nếu tìm được nonce, False nếu bị cancel.
+        """
+        prefix, target = self.header_prefix(), self.target()
+        if workers:
+            result = parallel_mine(prefix, target, workers, cancel, progress)
+        else:
+            result = serial_mine(prefix, target, cancel, progress)
+
+        if result is None:
+            return False
+        self.nonce, self.hash = result
+        return True
+
+    def to_dict(self, body=True):
+        """body=False: chỉ header (data=None), vd block đã prune."""
+        return {
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "data": self.data if body else None,
+            "previous_hash": self.previous_hash,
+            "bits": self.bits,
+            "nonce": self.nonce,
+            "data_root": self.data_root.hex(),
+            "hash": self.hash,
+        }
+
+    def size_ok(self):
+        """Bản ghi block không vượt MAX_BLOCK_SIZE (block chỉ có header → True)."""
+        return self.data is None or self.record_size() <= MAX_BLOCK_SIZE
+
+    def record_size(self):
+        return HEADER_SIZE + DATA_LEN.size + len(self.data.encode())
+
+    def to_bytes(self):
+        buf = bytearray(self.record_size())
+        self.write_into(buf)
+        return bytes(buf)
+
+    def write_into(self, buf, offset=0):
+        """Ghi bản ghi thẳng vào buffer có sẵn (bytearray / mmap), trả về offset kế tiếp."""
+        prev = bytes.fromhex(self.previous_hash) if self.previous_hash else ZERO_HASH
+        data = self.data.encode()
+        HEADER_PREFIX.pack_into(
+            buf, offset, self.index, self.timestamp, self.bits, prev, self.data_root
+        )
+        NONCE.pack_into(buf, offset + HEADER_PREFIX.size, self.nonce)
+        DATA_LEN.pack_into(buf, offset + HEADER_SIZE, len(data))
+        start = offset + HEADER_SIZE + DATA_LEN.size
+        memoryview(buf)[start:start + len(data)] = data
+        return start + len(data)
+
+    @staticmethod
+    def from_bytes(buf, offset=0, trusted=False):
+        """
+        Đọc 1 bản ghi tại offset, không copy header (unpack_from trên memoryview).
+        trusted=True (dữ liệu của chính node, vd BlockStore): dùng luôn data_root trong header.
+        Trả về (block, offset kế tiếp).
+        """
+        mv = memoryview(buf)
+        index, timestamp, bits, prev, _root = HEADER_PREFIX.unpack_from(mv, offset)
+        (nonce,) = NONCE.unpack_from(mv, offset + HEADER_PREFIX.size)
+        (n,) = DATA_LEN.unpack_from(mv, offset + HEADER_SIZE)
+        start = offset + HEADER_SIZE + DATA_LEN.size
+        data = str(mv[start:start + n], "utf-8")
+        b = Block(
+            index=index,
+            timestamp=timestamp,
+            data=data,
+            previous_hash=prev.hex() if prev != ZERO_HASH else None,
+            nonce=nonce,
+            bits=bits,
+        )
+        # mặc định data_root không lấy từ header mà tính lại từ data → header giả bị lộ qua hash
+        if trusted:
+            b._data_root = _root
+        return b, start + n
+
+    @staticmethod
+    def from_header(buf, offset=0):
+        """
+        Block chỉ có header (data=None, vd trong snapshot): data_root lấy từ header,
+        hash tính từ chính header nên vẫn kiểm tra PoW được.
+        """
+        mv = memoryview(buf)
+        index, timestamp, bits, prev, root = HEADER_PREFIX.unpack_from(mv, offset)
+        (nonce,) = NONCE.unpack_from(mv, offset + HEADER_PREFIX.size)
+        b = Block(
+            index=index,
+            timestamp=timestamp,
+            data=None,
+            previous_hash=prev.hex() if prev != ZERO_HASH else None,
+            nonce=nonce,
+            bits=bits,
+        )
+        b._data_root = root
+        return b
+
+    @staticmethod
+    def iter_bytes(buf):
+        """Duyệt các bản ghi nối tiếp nhau trong buf."""
+        offset, end = 0, len(buf)
+        while offset < end:
+            b, offset = Block.from_bytes(buf, offset)
+            yield b
 
     @staticmethod
     def from_dict(d):
-        return Block(
+        b = Block(
             index=d["index"],
             timestamp=d["timestamp"],
             data=d["data"],
             previous_hash=d["previous_hash"],
-            nonce=d["nonce"]
+            nonce=d["nonce"],
+            bits=d.get("bits", INITIAL_BITS),
+            claimed_hash=d.get("hash"),
         )
+        if b.data is None:
+            # chỉ có header: data_root lấy từ dict, hash vẫn tính lại từ header
+            b._data_root = bytes.fromhex(d["data_root"])
+        return b
 
     @staticmethod
-    def create_block(previous_block, data, index):
+    def create_block(
+        previous_block, data, index, bits=INITIAL_BITS, workers=None, cancel=None, progress=None
+    ):
         """
         CHỈ CÓ 1 HÀM TẠO BLOCK DUY NHẤT
         KHÔNG KHÁI NIỆM BLOCK ĐẦU
         block sinh ra từ TX & đào luôn
+        bits: target PoW (Blockchain.next_bits())
+        workers: số process đào song song (None = đào trên thread hiện tại)
+        Trả về None nếu bị cancel trước khi đào xong.
         """
         prev_hash = previous_block.hash if previous_block else None
 
@@ -53,7 +318,9 @@ class Block:
             timestamp=time.time(),
             data=data,
             previous_hash=prev_hash,
-            nonce=0
+            nonce=0,
+            bits=bits,
         )
-        b.mine()
+        if not b.mine(workers=workers, cancel=cancel, progress=progress):
+            return None
         return b
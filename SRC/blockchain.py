@@ -1,32 +1,562 @@
 # blockchain.py
+import json
+import os
+
 from block import Block
+from blocktree import BlockTree, block_work
+from difficulty import (
+    MEDIAN_TIME_SPAN,
+    RETARGET_WINDOW,
+    hash_meets_target,
+    next_bits,
+    timestamp_ok,
+)
+from ledger import Ledger
+from mempool import tx_id
+from snapshot import BASE_FILE, SNAPSHOT_FILE, Snapshot, checkpoint_for
+from validation import MALFORMED, validate_blocks
+
+
+def _same_block(bd, block):
+    """Dict peer gửi có đúng nội dung của block (đầy đủ data) ta đã kiểm chứng."""
+    return (
+        block.data is not None
+        and bd.get("data") == block.data
+        and bd.get("index") == block.index
+        and bd.get("timestamp") == block.timestamp
+        and bd.get("previous_hash") == block.previous_hash
+        and bd.get("bits") == block.bits
+        and bd.get("nonce") == block.nonce
+    )
 
 
 class Blockchain:
-    def __init__(self):
-        self.chains = []   
+    def __init__(self, store=None, prune_depth=None):
+        self.chains = []
+        # chuỗi nạp từ snapshot: chains[0] là header snapshot có index = base,
+        # block đầy đủ (có data) bắt đầu từ height full_from
+        self.base = 0
+        self.full_from = 0
+        # prune: chỉ giữ data của prune_depth block cuối (None = giữ toàn bộ),
+        # block cũ hơn còn header + hash; không reorg sâu hơn full_from được nữa
+        self.prune_depth = prune_depth
+        # height thấp nhất còn undo record (≥ full_from): block trước đó được nạp thẳng từ
+        # snapshot (số dư tại checkpoint) hoặc đã prune → không lùi số dư qua đó được
+        self.state_from = 0
+        self.base_snapshot = None
+        # snapshot checkpoint mới nhất đã dựng (gửi cho peer mới)
+        self.snapshot = None
+        # hash → height (== block.index) của block trong chuỗi chính
+        self.hash_index = {}
+        # mọi nhánh đã kiểm chứng + work tích luỹ; chains = nhánh nặng nhất
+        self.tree = BlockTree()
+        # số dư suy ra từ chuỗi chính; undo[i] = undo record của chains[i]
+        self.ledger = Ledger()
+        self.undo = []
+        # tx_id → height block chứa TX trong chuỗi chính (chặn đào lại TX đã có trên chuỗi)
+        self.tx_index = {}
+        # encoded[i] = dòng JSON (bytes) đã encode của chains[i], None = chưa encode.
+        # Encode 1 lần khi gửi lần đầu, dùng lại cho mọi peer / mọi lần sync sau.
+        self.encoded = []
+        # height bắt đầu phần bị thay trong lần replace_chain thành công gần nhất
+        self.replaced_from = 0
+        self.store = None
+        if store is not None:
+            self.attach_store(store)
+
+    def attach_store(self, store):
+        """
+        Gắn BlockStore (lưu đĩa). Store đã có dữ liệu → nạp lại chuỗi từ đĩa,
+        store rỗng → ghi chuỗi đang có trong RAM xuống.
+        Nạp lại: số dư + work lấy từ snapshot.dat (checkpoint node tự dựng) nếu nó khớp
+        block trong store, chỉ áp lại các block sau checkpoint.
+        """
+        base = Snapshot.load(os.path.join(store.path, BASE_FILE))
+        if base is not None or len(store):
+            # block trong store nối sau snapshot base (nếu có); dữ liệu của chính node
+            self._reset(base)
+            blocks = store.load_blocks()
+            snap = Snapshot.load(os.path.join(store.path, SNAPSHOT_FILE))
+            done = self._restore_checkpoint(snap, blocks)
+            if not done:
+                self.tree = BlockTree.from_chain(self.chains, base.base_work() if base else 0)
+            for b in blocks[done:]:
+                self.appendBlock(b)
+            self.store = store
+            self.snapshot = snap
+        else:
+            self.store = store
+            if self.base_snapshot is not None:
+                self.base_snapshot.save(os.path.join(store.path, BASE_FILE))
+            for b in self.chains[self.full_from - self.base:]:
+                store.append(b)
+
+    def _restore_checkpoint(self, snap, blocks):
+        """
+        Nối thẳng các block của store tới checkpoint `snap` vào chuỗi (chuỗi vừa _reset):
+        không áp lại ledger – số dư lấy từ snapshot, tree chỉ dựng từ các block cuối với
+        work của snapshot. Trả về số block đã nạp (0 nếu snapshot không khớp store).
+        TX trước checkpoint không vào tx_index (như khi bootstrap từ snapshot).
+        """
+        start = self._store_base()
+        if snap is None or not start < snap.height <= start + len(blocks):
+            return 0
+        done = snap.height - start
+        if blocks[done - 1].hash != snap.tip().hash:
+            return 0   # store đã reorg sau khi ghi snapshot
+        prefix = blocks[:done]
+        self.chains.extend(prefix)
+        self.hash_index.update((b.hash, b.index) for b in prefix)
+        self.undo.extend({} for _ in prefix)
+        self.encoded.extend(None for _ in prefix)
+        self.ledger.balances = dict(snap.balances)
+        self.state_from = snap.height
+        self.tree = BlockTree.from_chain(self.chains[-len(snap.headers):], snap.base_work())
+        return done
+
+    def _reset(self, snap=None):
+        """
+        Chuỗi chính rỗng, hoặc chỉ gồm các header của snapshot (ledger = số dư tại
+        checkpoint). Không đụng tới tree.
+        """
+        self.base_snapshot = snap
+        self.ledger = Ledger()
+        if snap is None:
+            self.base = self.full_from = 0
+            self.chains = []
+        else:
+            self.base = snap.headers[0].index
+            self.full_from = snap.height
+            self.chains = list(snap.headers)
+            self.ledger.balances = dict(snap.balances)
+        self.state_from = self.full_from
+        self.hash_index = {h.hash: h.index for h in self.chains}
+        # TX trước checkpoint không có trong snapshot
+        self.tx_index = {}
+        self.undo = [{} for _ in self.chains]
+        self.encoded = [None] * len(self.chains)
+
+    def _store_base(self):
+        """Height của block đầu tiên trong store."""
+        return self.base_snapshot.height if self.base_snapshot is not None else 0
+
+    def load_snapshot(self, snap, headers=()):
+        """
+        Bootstrap nhanh: bắt đầu từ snapshot do peer gửi thay vì replay lịch sử.
+        Chuỗi rỗng → chỉ kiểm tra header trong snapshot. Chuỗi đang có nhưng tụt sau
+        phần peer đã prune → `headers` (dict chỉ header, từ sau tip tới hết snapshot)
+        phải nối tip của ta tới tip snapshot: kiểm tra đầy đủ linkage, retarget, PoW.
+        Các block sau checkpoint nhận tiếp qua replace_chain như bình thường.
+        """
+        if not snap.verify():
+            return False
+        if not self.chains:
+            # không có chuỗi để tính lại work → lấy cận dưới kiểm chứng được, không tin peer
+            snap.work = min(snap.work, snap.min_work())
+            self._reset(snap)
+            self.tree = BlockTree.from_chain(snap.headers, snap.base_work())
+        else:
+            headers = list(headers)
+            if not headers or headers[-1].get("hash") != snap.tip().hash:
+                return False
+            tip = self.tip()
+            blocks = validate_blocks(headers, tip, self.chains[-(RETARGET_WINDOW + 1):])
+            if blocks is None:
+                return False
+            for b in blocks:
+                self.tree.add(b)
+            first = snap.headers[0]
+            base_work = self.tree.get(first.hash).work - block_work(first.bits)
+            self._reset(snap)
+            # work tính từ header đã kiểm tra, không tin work peer ghi trong snapshot
+            snap.work = self.tree.get(snap.tip().hash).work
+            self.tree = BlockTree.from_chain(snap.headers, base_work)
+        if self.store is not None:
+            self.store.truncate(0)
+            snap.save(os.path.join(self.store.path, BASE_FILE))
+        return True
 
     def appendBlock(self, block):
+        """ValueError (chuỗi không đổi) nếu block không nối tiếp tip hoặc tiêu quá số dư."""
+        tip = self.tip()
+        if block.index != self.height() or block.previous_hash != (tip.hash if tip else None):
+            raise ValueError(f"Block #{block.index} không nối tiếp tip (height {self.height()})")
+        ids = self._new_tx_ids(block)
+        if ids is None:
+            raise ValueError(f"Block #{block.index} có TX trùng hoặc TX đã có trên chuỗi")
+        self.undo.append(self.ledger.apply_block(block))
+        for txid in ids:
+            self.tx_index[txid] = block.index
+        self.encoded.append(None)
+        self.hash_index[block.hash] = block.index
         self.chains.append(block)
+        self.tree.add(block)
+        if self.store is not None:
+            self.store.append(block)
+            if checkpoint_for(self.height()) > checkpoint_for(self.height() - 1):
+                self.save_snapshot()
+        if self.prune_depth is not None:
+            self.prune()
+
+    def validate_next(self, block):
+        """
+        Kiểm tra đầy đủ 1 block nối ngay sau tip (block đề xuất / commit từ peer):
+        data chuẩn, kích thước ≤ MAX_BLOCK_SIZE, hash khớp, index == height, previous_hash == hash tip, bits đúng retarget,
+        PoW, timestamp, TX không trùng / không phát lại và không tiêu quá số dư.
+        Field sai kiểu / sai dạng → False.
+        """
+        try:
+            return self._check_next(block)
+        except MALFORMED:
+            return False
+
+    def _check_next(self, block):
+        if not block.data_ok() or block.data is None or not block.size_ok():
+            return False
+        if not block.hash_matches_claim():
+            return False
+        tip = self.tip()
+        if block.index != self.height() or block.previous_hash != (tip.hash if tip else None):
+            return False
+        if block.bits != self.next_bits() or not hash_meets_target(block.hash, block.bits):
+            return False
+        if not timestamp_ok(block.timestamp, self.chains[-MEDIAN_TIME_SPAN:]):
+            return False
+        return self._new_tx_ids(block) is not None and self.ledger.check_block(block)
+
+    def _new_tx_ids(self, block):
+        """
+        tx_id các TX của block, hoặc None nếu block chứa 1 TX 2 lần hoặc TX đã có trên
+        chuỗi chính (phát lại). tx_index chỉ gồm TX từ state_from: TX trước checkpoint
+        của snapshot không kiểm tra được (bootstrap / nạp lại từ snapshot).
+        """
+        ids = [tx_id(tx) for tx in block.transactions()]
+        if len(set(ids)) != len(ids) or any(txid in self.tx_index for txid in ids):
+            return None
+        return ids
+
+    def prune(self):
+        """
+        Bỏ data (và undo record) của block sâu hơn prune_depth, giữ header + hash.
+        Không prune quá checkpoint mới nhất → luôn gửi được snapshot + block sau nó.
+        """
+        height = min(self.height() - self.prune_depth, checkpoint_for(self.height()))
+        if height <= self.full_from:
+            return
+        for b in self.chains[self.full_from - self.base:height - self.base]:
+            b.data_root   # header cần data_root, tính trước khi bỏ data
+            b.hash
+            b.data = None
+        for pos in range(self.full_from - self.base, height - self.base):
+            self.undo[pos] = {}
+            self.encoded[pos] = None
+        self.full_from = max(self.full_from, height)
+        self.state_from = max(self.state_from, height)
+
+    # ----- tra cứu -----
+    def height(self):
+        """Số block trong chuỗi (= index của block kế tiếp)."""
+        return self.base + len(self.chains)
+
+    def tip(self):
+        return self.chains[-1] if self.chains else None
+
+    def has_block(self, block_hash):
+        return block_hash in self.hash_index
+
+    def has_tx(self, txid):
+        """TX (theo mempool.tx_id) đã nằm trong 1 block của chuỗi chính."""
+        return txid in self.tx_index
+
+    def position_of(self, block_hash):
+        """Height của block có hash này, hoặc None."""
+        return self.hash_index.get(block_hash)
+
+    def fork_point(self, block_hash):
+        """
+        Height của tổ tiên chung gần nhất giữa block `block_hash` (có thể nằm trên nhánh phụ
+        trong tree) và chuỗi chính: chính block đó nếu nằm trên chuỗi chính,
+        -1 nếu không có tổ tiên chung (khác từ block đầu), None nếu không biết block.
+        """
+        node = self.tree.get(block_hash)
+        if node is None:
+            return self.hash_index.get(block_hash)
+        while node is not None:
+            pos = self.hash_index.get(node.block.hash)
+            if pos is not None:
+                return pos
+            node = node.parent
+        return -1
+
+    def get_by_hash(self, block_hash):
+        i = self.hash_index.get(block_hash)
+        return self.chains[i - self.base] if i is not None else None
 
-    def to_list(self):
-        return [b.to_dict() for b in self.chains]
+    def get_by_height(self, height):
+        if self.base <= height < self.height():
+            return self.chains[height - self.base]
+        return None
+
+    def next_bits(self):
+        """Target (compact bits) bắt buộc cho block kế tiếp."""
+        return next_bits(self.chains[-(RETARGET_WINDOW + 1):])
+
+    def next_bits_after(self, block_hash):
+        """
+        Target (compact bits) bắt buộc cho block con của `block_hash` (None = block đầu
+        chuỗi), theo nhánh chứa nó trong tree; None nếu không biết block.
+        """
+        if block_hash is None:
+            return next_bits([])
+        node = self.tree.get(block_hash)
+        if node is None:
+            return None
+        return next_bits(self.tree.ancestors(node, RETARGET_WINDOW + 1))
+
+    def blocks_from(self, height):
+        """Các block của chuỗi chính từ height trở đi."""
+        return self.chains[max(height - self.base, 0):]
+
+    def iter_dicts(self, start=0):
+        """
+        Generator các block đầy đủ từ height `start` (header snapshot / block đã prune
+        thì không) – dựng dict từng block một thay vì cả list.
+        """
+        end = self.height()
+        for h in range(max(start, self.full_from), end):
+            b = self.get_by_height(h)
+            if b is None:
+                return   # chuỗi bị cắt (reorg) trong lúc đang xuất
+            yield b.to_dict()
+
+    def to_list(self, start=0):
+        return list(self.iter_dicts(start))
+
+    def iter_lines(self, start=0):
+        """Như iter_dicts nhưng trả về dòng JSON đã encode (bytes, có "\\n"), qua cache."""
+        end = self.height()
+        for h in range(max(start, self.full_from), end):
+            pos = h - self.base
+            try:
+                line = self.encoded[pos]
+                if line is None:
+                    line = (json.dumps(self.chains[pos].to_dict()) + "\n").encode()
+                    self.encoded[pos] = line
+            except IndexError:
+                return   # chuỗi bị cắt (reorg) trong lúc đang xuất
+            yield line
+
+    def iter_header_lines(self, start, end):
+        """
+        Generator dòng JSON (bytes, có "\n") của dict chỉ header các block trong [start, end)
+        – gửi được cả phần đã prune.
+        """
+        for h in range(max(start, self.base), min(end, self.height())):
+            b = self.get_by_height(h)
+            if b is None:
+                return   # chuỗi bị cắt (reorg) trong lúc đang xuất
+            yield (json.dumps(b.to_dict(body=False)) + "\n").encode()
+
+    # ----- snapshot -----
+    def make_snapshot(self, height):
+        """Snapshot trạng thái sau `height` block đầu – lùi ledger bằng undo record."""
+        if self.base_snapshot is not None and height == self.base_snapshot.height:
+            return self.base_snapshot
+        if not self.state_from <= height <= self.height() or height == 0:
+            return None
+        ledger = Ledger()
+        ledger.balances = dict(self.ledger.balances)
+        for undo in reversed(self.undo[height - self.base:]):
+            ledger.revert_block(undo)
+        lo = max(self.base, height - (RETARGET_WINDOW + 1))
+        headers = [
+            Block.from_header(b.header_bytes())
+            for b in self.chains[lo - self.base:height - self.base]
+        ]
+        work = self.tree.get(headers[-1].hash).work
+        return Snapshot(height, work, headers, ledger.balances)
+
+    def latest_snapshot(self):
+        """Snapshot checkpoint mới nhất còn nằm trên chuỗi chính (None nếu chưa có)."""
+        cp = checkpoint_for(self.height())
+        snap = self.snapshot
+        if snap is not None and snap.height == cp and self.has_block(snap.tip().hash):
+            return snap
+        new = self.make_snapshot(cp) if cp else None
+        if new is None and snap is not None and self.has_block(snap.tip().hash):
+            new = snap   # checkpoint cũ hơn nhưng vẫn trên chuỗi chính
+        if new is None:
+            new = self.base_snapshot
+        self.snapshot = new
+        return new
+
+    def save_snapshot(self):
+        snap = self.latest_snapshot()
+        if snap is not None and self.store is not None:
+            snap.save(os.path.join(self.store.path, SNAPSHOT_FILE))
+
+    def _truncate(self, height):
+        """
+        Bỏ các block từ height trở đi khỏi chuỗi chính – O(số block bị bỏ).
+        Chúng vẫn nằm trong tree như 1 nhánh phụ.
+        Cắt store trước: lỗi ghi đĩa (OSError) raise ra khi chuỗi trong RAM chưa đổi.
+        """
+        if height < self.state_from:
+            # nhánh mới đi từ block đầu chuỗi, qua cả checkpoint → bỏ snapshot base
+            if self.store is not None:
+                self.store.truncate(0)
+                try:
+                    os.remove(os.path.join(self.store.path, BASE_FILE))
+                except FileNotFoundError:
+                    pass
+            self._reset()
+            return
+        if self.store is not None:
+            self.store.truncate(height - self._store_base())
+        pos = height - self.base
+        for b in self.chains[pos:]:
+            self.hash_index.pop(b.hash, None)
+            for tx in b.transactions():
+                if self.tx_index.get(tx_id(tx)) == b.index:
+                    del self.tx_index[tx_id(tx)]
+        for undo in reversed(self.undo[pos:]):
+            self.ledger.revert_block(undo)
+        del self.chains[pos:]
+        del self.undo[pos:]
+        del self.encoded[pos:]
+
+    def _find_fork(self, block_dicts):
+        """
+        Tìm block đã biết (trong tree, kể cả nhánh phụ) mà payload nối vào.
+        Trả về (TreeNode cha hoặc None nếu payload bắt đầu từ block đầu chuỗi,
+        vị trí dict đầu tiên chưa biết) hoặc None nếu payload không nối được.
+        Duyệt ngược từ cuối payload: ca thường gặp (thêm 1 block) chỉ tốn O(1).
+        """
+        for j in range(len(block_dicts) - 1, -1, -1):
+            bd = block_dicts[j]
+            node = self.tree.get(bd.get("hash"))
+            if node is None or node.height != bd.get("index"):
+                continue
+            # hash khớp block đã biết → cả tổ tiên cũng khớp (hash cam kết previous_hash).
+            # Chỉ cần xác minh hash gửi kèm đúng với nội dung dict này: trùng từng field với
+            # block đã kiểm chứng thì khỏi dựng Block / tính lại data_root + hash.
+            if _same_block(bd, node.block) or Block.from_dict(bd).hash_matches_claim():
+                return node, j + 1
+            return None
+
+        if not block_dicts:
+            return None
+        first = block_dicts[0]
+        if first["index"] == 0:
+            return None, 0
+        # payload chỉ có phần đuôi: block đầu phải nối vào 1 block đã biết
+        parent = self.tree.get(first["previous_hash"])
+        if parent is None or parent.height + 1 != first["index"]:
+            return None
+        return parent, 0
 
     def replace_chain(self, block_dicts):
-        new_chain = []
-        prev_hash = None
+        """
+        Nhận chuỗi từ peer (toàn bộ hoặc chỉ phần đuôi). Chỉ dựng và kiểm tra đầy đủ
+        (validation.validate_blocks) phần chưa biết, thêm vào tree rồi chuyển sang
+        nhánh có work tích luỹ lớn nhất. Trả về True nếu chuỗi chính đổi.
+        """
+        block_dicts = list(block_dicts)
+        try:
+            found = self._find_fork(block_dicts)
+            if found is None:
+                return False
+            parent, start = found
+            suffix_dicts = block_dicts[start:]
+            if any(bd.get("data") is None for bd in suffix_dicts):
+                # block chỉ có header không áp được vào ledger
+                return False
+        except MALFORMED:
+            return False
+
+        if suffix_dicts:
+            # kiểm tra đầy đủ phần đuôi: nối chuỗi tuần tự, hash + PoW song song
+            recent = self.tree.ancestors(parent, RETARGET_WINDOW + 1)
+            new_blocks = validate_blocks(
+                suffix_dicts, parent.block if parent else None, recent
+            )
+            if new_blocks is None:
+                return False
+            for b in new_blocks:
+                self.tree.add(b)
 
-        for i, bd in enumerate(block_dicts):
-            b = Block.from_dict(bd)
+        return self._reorg_to_best()
 
-            # kiểm tra nối chuỗi
-            if i > 0 and b.previous_hash != prev_hash:
+    def _reorg_to_best(self):
+        """
+        Chuyển chuỗi chính sang tip nặng nhất của tree – O(độ sâu reorg).
+        Nhánh không theo được / có block hỏng bị bỏ khỏi tree rồi xét tip nặng nhất kế tiếp.
+        OSError khi ghi store được raise, chuỗi chính giữ như cũ.
+        """
+        while True:
+            best = self.tree.best
+            tip = self.tip()
+            if best is None or (tip is not None and best.block.hash == tip.hash):
+                return False
+            if tip is not None and best.work <= self.tree.get(tip.hash).work:
                 return False
 
-            prev_hash = b.hash
-            new_chain.append(b)
+            # đi ngược từ tip mới tới block nằm trên chuỗi chính
+            branch = []
+            node = best
+            while node is not None and self.hash_index.get(node.block.hash) != node.height:
+                branch.append(node.block)
+                node = node.parent
+            fork = node.height + 1 if node is not None else 0
+            pruned = self.full_from > self._store_base()
+            if fork < self.state_from and (node is not None or pruned):
+                # rẽ nhánh bên trong header snapshot / phần đã prune / trước checkpoint đã
+                # nạp: không có số dư (hoặc data để quay lại) tại đó → không theo được
+                self.tree.discard(branch[-1].hash)
+                continue
 
-        if len(new_chain) > len(self.chains):
-            self.chains = new_chain
+            old_base = self.base_snapshot
+            old = self.chains[max(fork, self.full_from) - self.base:]
+            # prune sau khi reorg xong (quay lại chuỗi cũ cần data của các block này)
+            prune_depth, self.prune_depth = self.prune_depth, None
+            try:
+                switched = self._switch_branch(fork, branch, old, old_base)
+            finally:
+                self.prune_depth = prune_depth
+            if not switched:
+                continue
+            if prune_depth is not None:
+                self.prune()
             return True
-        return False
+
+    def _switch_branch(self, fork, branch, old, old_base):
+        """
+        Áp nhánh (block từ fork tới tip mới). False nếu có block không áp được (ValueError
+        khi tiêu quá số dư / TX trùng, hoặc lỗi bất kỳ khác): đã quay lại chuỗi cũ và bỏ
+        nhánh hỏng khỏi tree.
+        OSError (lỗi đĩa của store, không phải do block): quay lại chuỗi cũ rồi raise lại,
+        nhánh vẫn giữ trong tree.
+        """
+        self._truncate(fork)
+        for b in reversed(branch):
+            try:
+                self.appendBlock(b)
+            except OSError:
+                self._restore(fork, old, old_base)
+                raise
+            except Exception:
+                self._restore(fork, old, old_base)
+                self.tree.discard(b.hash)
+                return False
+        self.replaced_from = fork
+        return True
+
+    def _restore(self, fork, old, old_base):
+        """Quay lại chuỗi chính cũ: bỏ phần đã áp từ fork, áp lại các block cũ `old`."""
+        self._truncate(fork)
+        if old_base is not None and self.base_snapshot is None:
+            self._reset(old_base)
+            if self.store is not None:
+                old_base.save(os.path.join(self.store.path, BASE_FILE))
+        for ob in old:
+            self.appendBlock(ob)
@@ -0,0 +1,213 @@
+# blockstore.py
+# Lưu block xuống đĩa dạng append-only:
+#   blk00000.dat, blk00001.dat, ...   bản ghi Block.to_bytes() nối tiếp nhau
+#   index.dat                         header (magic | count) + mỗi block 1 entry cố định,
+#                                     đọc/ghi qua mmap
+# fsync theo nhóm (group commit): ghi xuống OS ngay, fsync gộp mỗi SYNC_EVERY block
+# hoặc SYNC_INTERVAL giây. count trong index chỉ tăng SAU khi segment đã fsync,
+# nên khi mất điện chỉ mất các block cuối chưa fsync, không bao giờ đọc phải rác.
+import mmap
+import os
+import struct
+import threading
+
+from block import Block
+
+SEGMENT_SIZE = 64 * 1024 * 1024   # mỗi file segment tối đa ~64MB
+SYNC_EVERY = 64                   # fsync sau mỗi N block ...
+SYNC_INTERVAL = 0.2               # ... hoặc sau N giây
+
+INDEX_MAGIC = b"BIDX0001"
+INDEX_HEADER = struct.Struct(">8sQ")       # magic | số block đã bền vững
+# segment | offset | độ dài bản ghi | hash block
+INDEX_ENTRY = struct.Struct(">IQI32s")
+INITIAL_CAPACITY = 4096
+
+
+class BlockStore:
+    def __init__(self, path, sync_every=SYNC_EVERY, sync_interval=SYNC_INTERVAL):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        os.makedirs(path, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.closed = False
+
+        self._open_index()
+        self.count = self.durable_count
+        self.unsynced = 0
+
+        # segment đang ghi = segment của block cuối (hoặc 0)
+        if self.count:
+            seg, _off, _len, _h = self._entry(self.count - 1)
+        else:
+            seg = 0
+        self._open_segment(seg)
+
+        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flusher.start()
+
+    # ----- index (mmap) -----
+    def _index_path(self):
+        return os.path.join(self.path, "index.dat")
+
+    def _open_index(self):
+        path = self._index_path()
+        fresh = not os.path.exists(path) or os.path.getsize(path) < INDEX_HEADER.size
+        self.index_file = open(path, "r+b" if not fresh else "w+b")
+        if fresh:
+            self.index_file.truncate(INDEX_HEADER.size + INITIAL_CAPACITY * INDEX_ENTRY.size)
+        self.index_map = mmap.mmap(self.index_file.fileno(), 0)
+        if fresh:
+            INDEX_HEADER.pack_into(self.index_map, 0, INDEX_MAGIC, 0)
+            self.index_map.flush()
+        magic, self.durable_count = INDEX_HEADER.unpack_from(self.index_map, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"index.dat không hợp lệ: {path}")
+
+    def _capacity(self):
+        return (len(self.index_map) - INDEX_HEADER.size) // INDEX_ENTRY.size
+
+    def _grow_index(self):
+        new_cap = self._capacity() * 2
+        self.index_map.flush()
+        self.index_map.close()
+        self.index_file.truncate(INDEX_HEADER.size + new_cap * INDEX_ENTRY.size)
+        self.index_map = mmap.mmap(self.index_file.fileno(), 0)
+
+    def _entry(self, height):
+        return INDEX_ENTRY.unpack_from(
+            self.index_map, INDEX_HEADER.size + height * INDEX_ENTRY.size
+        )
+
+    # ----- segment -----
+    def _segment_path(self, seg):
+        return os.path.join(self.path, f"blk{seg:05d}.dat")
+
+    def _open_segment(self, seg):
+        self.segment = seg
+        self.segment_file = open(self._segment_path(seg), "ab")
+        self.segment_size = self.segment_file.tell()
+        self.dirty_segments = set()
+
+    # ----- API -----
+    def __len__(self):
+        return self.count
+
+    def append(self, block):
+        """Ghi xuyên xuống OS ngay; fsync được gộp theo nhóm."""
+        record = block.to_bytes()
+        with self.lock:
+            if self.segment_size and self.segment_size + len(record) > SEGMENT_SIZE:
+                self._sync_locked()
+                self.segment_file.close()
+                self._open_segment(self.segment + 1)
+
+            offset = self.segment_size
+            self.segment_file.write(record)
+            self.segment_file.flush()
+            self.segment_size += len(record)
+            self.dirty_segments.add(self.segment)
+
+            if self.count >= self._capacity():
+                self._grow_index()
+            INDEX_ENTRY.pack_into(
+                self.index_map,
+                INDEX_HEADER.size + self.count * INDEX_ENTRY.size,
+                self.segment,
+                offset,
+                len(record),
+                bytes.fromhex(block.hash),
+            )
+            self.count += 1
+            self.unsynced += 1
+            if self.unsynced >= self.sync_every:
+                self._sync_locked()
+            else:
+                self.cond.notify()
+
+    def truncate(self, height):
+        """Bỏ các block từ `height` trở đi (reorg). Dữ liệu cũ trong segment thành rác."""
+        with self.lock:
+            if height >= self.count:
+                return
+            self._sync_locked()
+            self.count = height
+            self._write_count_locked()
+
+    def flush(self):
+        with self.lock:
+            self._sync_locked()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self._sync_locked()
+            self.closed = True
+            self.cond.notify()
+            self.segment_file.close()
+            self.index_map.close()
+            self.index_file.close()
+
+    def _sync_locked(self):
+        if not self.unsynced and self.durable_count == self.count:
+            return
+        self.segment_file.flush()
+        for seg in self.dirty_segments:
+            if seg == self.segment:
+                os.fsync(self.segment_file.fileno())
+            else:
+                with open(self._segment_path(seg), "rb") as f:
+                    os.fsync(f.fileno())
+        self.dirty_segments = set()
+        self._write_count_locked()
+        self.unsynced = 0
+
+    def _write_count_locked(self):
+        INDEX_HEADER.pack_into(self.index_map, 0, INDEX_MAGIC, self.count)
+        self.index_map.flush()
+        self.durable_count = self.count
+
+    def _flush_loop(self):
+        with self.lock:
+            while not self.closed:
+                self.cond.wait(self.sync_interval)
+                if self.closed:
+                    return
+                if self.unsynced:
+                    self._sync_locked()
+
+    # ----- đọc -----
+    def load_blocks(self):
+        """
+        Đọc lại toàn bộ chuỗi khi khởi động: vị trí lấy từ index (không quét segment),
+        header giải nén thẳng trên mmap, hash lấy từ index (không SHA-256 lại).
+        """
+        blocks = []
+        maps = {}
+        try:
+            for height in range(self.count):
+                seg, offset, _length, h = self._entry(height)
+                if seg not in maps:
+                    with open(self._segment_path(seg), "rb") as f:
+                        maps[seg] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                b, _end = Block.from_bytes(maps[seg], offset, trusted=True)
+                b.hash = h.hex()
+                blocks.append(b)
+        finally:
+            for m in maps.values():
+                m.close()
+        return blocks
+
+    def read_block(self, height):
+        with self.lock:
+            seg, offset, length, h = self._entry(height)
+        with open(self._segment_path(seg), "rb") as f:
+            f.seek(offset)
+            buf = f.read(length)
+        b, _end = Block.from_bytes(buf, 0, trusted=True)
+        b.hash = h.hex()
+        return b
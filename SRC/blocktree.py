@@ -0,0 +1,98 @@
+# blocktree.py
+# Cây block: giữ mọi nhánh đã kiểm chứng (không chỉ chuỗi chính), mỗi nút có
+# tổng work tích luỹ từ gốc. Nhánh nặng nhất (nhiều work nhất) là chuỗi chính.
+from difficulty import bits_to_target
+
+
+def block_work(bits):
+    """Số hash kỳ vọng để tìm được block với target này."""
+    return (1 << 256) // (bits_to_target(bits) + 1)
+
+
+class TreeNode:
+    __slots__ = ("block", "parent", "height", "work")
+
+    def __init__(self, block, parent, work):
+        self.block = block
+        self.parent = parent        # TreeNode cha (None = gốc)
+        self.height = block.index
+        self.work = work            # work tích luỹ tới block này
+
+
+class BlockTree:
+    def __init__(self):
+        self.nodes = {}   # hash → TreeNode
+        self.tips = {}    # hash của nút lá → work tích luỹ
+        self.best = None  # TreeNode lá có work lớn nhất
+
+    def __contains__(self, block_hash):
+        return block_hash in self.nodes
+
+    def get(self, block_hash):
+        return self.nodes.get(block_hash)
+
+    def add(self, block, base_work=0):
+        """
+        Thêm block đã kiểm chứng. Cha phải có trong cây, trừ khi là block đầu chuỗi
+        (previous_hash None) hoặc cây đang rỗng (gốc).
+        base_work: work tích luỹ trước gốc (gốc là header của snapshot).
+        Trả về TreeNode, hoặc None nếu không biết cha.
+        """
+        node = self.nodes.get(block.hash)
+        if node is not None:
+            return node
+
+        parent = self.nodes.get(block.previous_hash) if block.previous_hash else None
+        if parent is None and block.previous_hash and self.nodes:
+            return None
+
+        work = (parent.work if parent else base_work) + block_work(block.bits)
+        node = TreeNode(block, parent, work)
+        self.nodes[block.hash] = node
+
+        if parent is not None:
+            self.tips.pop(parent.block.hash, None)
+        self.tips[block.hash] = work
+        # hoà work → giữ tip cũ (block thấy trước thắng)
+        if self.best is None or work > self.best.work:
+            self.best = node
+        return node
+
+    def discard(self, block_hash):
+        """
+        Bỏ block (và mọi block con cháu) khỏi cây – dùng khi nhánh hoá ra không hợp lệ
+        (VD tiêu quá số dư). Hiếm gặp nên chấp nhận O(số nút).
+        """
+        node = self.nodes.get(block_hash)
+        if node is None:
+            return
+        bad = {node}
+        for n in sorted(self.nodes.values(), key=lambda n: n.height):
+            if n.parent in bad:
+                bad.add(n)
+        for n in bad:
+            del self.nodes[n.block.hash]
+            self.tips.pop(n.block.hash, None)
+
+        parent = node.parent
+        if parent is not None and not any(n.parent is parent for n in self.nodes.values()):
+            self.tips[parent.block.hash] = parent.work
+        if self.best in bad:
+            best_hash = max(self.tips, key=self.tips.get, default=None)
+            self.best = self.nodes[best_hash] if best_hash else None
+
+    def ancestors(self, node, count):
+        """`count` block cuối tính tới node (cũ → mới), để retarget."""
+        out = []
+        while node is not None and len(out) < count:
+            out.append(node.block)
+            node = node.parent
+        out.reverse()
+        return out
+
+    @staticmethod
+    def from_chain(blocks, base_work=0):
+        tree = BlockTree()
+        for b in blocks:
+            tree.add(b, base_work)
+        return tree
@@ -0,0 +1,107 @@
+# chainio.py
+# Xuất / nhập chuỗi dạng luồng JSON Lines: mỗi dòng 1 block dict, dòng rỗng = hết luồng.
+# Gửi / nhập theo chunk → bộ nhớ đỉnh chỉ cỡ 1 chunk, không phụ thuộc chiều cao chuỗi.
+# Tiếp tục được: xuất từ height bất kỳ, bên nhận giữ các chunk đã nhập (trong tree)
+# nên chỉ cần xin lại từ tip mới.
+import json
+from itertools import islice
+
+# số block / chunk (1 lần gửi, 1 lần replace_chain); ≥ validation.PARALLEL_THRESHOLD
+# để mỗi chunk được kiểm tra song song
+CHUNK_BLOCKS = 256
+# số byte tối đa / chunk: 1 chunk = 1 frame trên dây, phải dưới peer_net.MAX_FRAME_SIZE
+CHUNK_BYTES = 8 * 1024 * 1024
+# header (~330 byte / dòng) gửi theo chunk lớn hơn: chuỗi dài không dồn vào 1 frame
+HEADER_CHUNK = 4096
+
+
+def iter_chunks(blockchain, start=0, chunk=CHUNK_BLOCKS, max_bytes=CHUNK_BYTES):
+    """
+    Generator bytes, mỗi phần tối đa `chunk` dòng JSONL và `max_bytes` byte (không có dòng
+    kết thúc); 1 block lớn hơn max_bytes đi riêng 1 phần.
+    Dòng của từng block lấy từ cache encode của Blockchain (iter_lines).
+    """
+    return _pack(blockchain.iter_lines(start), chunk, max_bytes)
+
+
+def iter_header_chunks(blockchain, start, end, chunk=HEADER_CHUNK, max_bytes=CHUNK_BYTES):
+    """Như iter_chunks cho header (dict không có data) các block trong [start, end)."""
+    return _pack(blockchain.iter_header_lines(start, end), chunk, max_bytes)
+
+
+def _pack(lines_iter, chunk, max_bytes):
+    lines, size = [], 0
+    for line in lines_iter:
+        if lines and size + len(line) > max_bytes:
+            yield b"".join(lines)
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line)
+        if len(lines) >= chunk:
+            yield b"".join(lines)
+            lines, size = [], 0
+    if lines:
+        yield b"".join(lines)
+
+
+def export_jsonl(blockchain, start=0, chunk=CHUNK_BLOCKS, max_bytes=CHUNK_BYTES):
+    """Như iter_chunks, thêm dòng rỗng kết thúc luồng (cho file / luồng không có frame)."""
+    yield from iter_chunks(blockchain, start, chunk, max_bytes)
+    yield b"\n"
+
+
+def iter_jsonl(f):
+    """Đọc block dict từ file-like nhị phân (vd socket.makefile("rb")) tới dòng rỗng / EOF."""
+    for line in f:
+        line = line.strip()
+        if not line:
+            return
+        yield json.loads(line)
+
+
+def _chunks(items, size):
+    it = iter(items)
+    while True:
+        part = list(islice(it, size))
+        if not part:
+            return
+        yield part
+
+
+def import_chunk(blockchain, part):
+    """
+    Nhập 1 chunk qua replace_chain (chunk sau nối vào chunk trước trong tree).
+    Trả về (tiếp tục được?, height bắt đầu phần bị thay hoặc None nếu chuỗi chính không đổi).
+    """
+    if blockchain.replace_chain(part):
+        return True, blockchain.replaced_from
+    # hợp lệ nhưng chưa nặng hơn → vẫn nằm trong tree, chunk sau có thể nối tiếp
+    return part[-1].get("hash") in blockchain.tree, None
+
+
+def import_blocks(blockchain, block_dicts, chunk=CHUNK_BLOCKS):
+    """
+    Nhập luồng block theo chunk. Trả về height thấp nhất bị thay trong chuỗi chính,
+    hoặc None nếu chuỗi chính không đổi.
+    Dừng ở chunk không hợp lệ đầu tiên; các chunk trước đó vẫn được giữ.
+    """
+    replaced = None
+    for part in _chunks(block_dicts, chunk):
+        ok, start = import_chunk(blockchain, part)
+        if start is not None and (replaced is None or start < replaced):
+            replaced = start
+        if not ok:
+            break
+    return replaced
+
+
+def dump(blockchain, path, start=0):
+    """Ghi chuỗi từ height `start` ra file JSONL."""
+    with open(path, "wb") as f:
+        for part in export_jsonl(blockchain, start):
+            f.write(part)
+
+
+def load(blockchain, path):
+    with open(path, "rb") as f:
+        return import_blocks(blockchain, iter_jsonl(f))
@@ -0,0 +1,89 @@
+# difficulty.py
+# Target PoW dạng số nguyên, lưu trong header dưới dạng "compact bits" (như Bitcoin nBits)
+# và tự điều chỉnh (retarget) theo timestamp các block gần nhất.
+import time
+
+TARGET_BLOCK_TIME = 10.0   # số giây mong muốn giữa 2 block
+RETARGET_WINDOW = 10       # số khoảng cách block dùng để tính lại target
+MAX_ADJUST = 4             # mỗi lần retarget thay đổi tối đa x4 / :4
+MEDIAN_TIME_SPAN = RETARGET_WINDOW + 1   # timestamp phải > trung vị của N block trước
+MAX_FUTURE_DRIFT = 120.0   # timestamp không được vượt quá giờ hiện tại + N giây
+
+
+def difficulty_to_target(difficulty):
+    """difficulty = số '0' hex đầu hash  →  hash (số nguyên 256 bit) phải < target."""
+    return 1 << (256 - 4 * difficulty)
+
+
+def bits_to_target(bits):
+    exponent = bits >> 24
+    mantissa = bits & 0x007FFFFF
+    if exponent <= 3:
+        return mantissa >> (8 * (3 - exponent))
+    return mantissa << (8 * (exponent - 3))
+
+
+def target_to_bits(target):
+    size = (target.bit_length() + 7) // 8
+    if size <= 3:
+        mantissa = target << (8 * (3 - size))
+    else:
+        mantissa = target >> (8 * (size - 3))
+    # bit 0x00800000 là bit dấu trong compact → dịch thêm 1 byte
+    if mantissa & 0x00800000:
+        mantissa >>= 8
+        size += 1
+    return (size << 24) | mantissa
+
+
+# target dễ nhất cho phép (1 số '0' đầu hash)
+MAX_TARGET = bits_to_target(target_to_bits(difficulty_to_target(1)))
+# target của block đầu tiên: tương đương DIFFICULTY = 3 cũ
+INITIAL_BITS = target_to_bits(difficulty_to_target(3))
+
+
+def hash_meets_target(block_hash, bits):
+    """hash < target; target vượt MAX_TARGET (bits dễ hơn mức dễ nhất, kể cả > 2^256) → False."""
+    target = bits_to_target(bits)
+    return target <= MAX_TARGET and int(block_hash, 16) < target
+
+
+def next_bits(recent_blocks):
+    """
+    Tính bits cho block kế tiếp từ các block cuối chuỗi (cũ → mới).
+    target_mới = target_trung_bình_cửa_sổ * thời_gian_thực / thời_gian_mong_muốn (giới hạn x4).
+    Lấy trung bình target của chính các block đã đo thời gian (không phải target block cuối)
+    → 1 đoạn chậm chỉ được bù 1 lần dù retarget chạy ở mọi block.
+    """
+    if len(recent_blocks) < 2:
+        return recent_blocks[-1].bits if recent_blocks else INITIAL_BITS
+
+    window = recent_blocks[-(RETARGET_WINDOW + 1):]
+    expected = TARGET_BLOCK_TIME * (len(window) - 1)
+    actual = window[-1].timestamp - window[0].timestamp
+    actual = max(expected / MAX_ADJUST, min(expected * MAX_ADJUST, actual))
+
+    avg_target = sum(bits_to_target(b.bits) for b in window[1:]) // (len(window) - 1)
+    # nhân chia theo mili giây để giữ phép tính số nguyên
+    target = avg_target * int(actual * 1000) // int(expected * 1000)
+    # target 0 → không hash nào đạt, mạng ngừng đào
+    return target_to_bits(max(1, min(target, MAX_TARGET)))
+
+
+def median_time(recent_blocks):
+    """Trung vị timestamp của MEDIAN_TIME_SPAN block cuối (None nếu chưa có block)."""
+    times = sorted(b.timestamp for b in recent_blocks[-MEDIAN_TIME_SPAN:])
+    return times[len(times) // 2] if times else None
+
+
+def timestamp_ok(timestamp, recent_blocks, now=None):
+    """
+    Timestamp hợp lệ: > trung vị các block trước và không quá MAX_FUTURE_DRIFT giây
+    sau giờ hiện tại → miner không tự chỉnh được đầu vào của retarget.
+    """
+    if now is None:
+        now = time.time()
+    if timestamp > now + MAX_FUTURE_DRIFT:
+        return False
+    median = median_time(recent_blocks)
+    return median is None or timestamp > median
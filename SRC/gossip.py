@@ -0,0 +1,51 @@
+# gossip.py
+# Lan truyền gossip thay cho full mesh: mỗi message mang id duy nhất; node nhận lần đầu
+# thì xử lý + chuyển tiếp, các bản trùng (đã thấy id) bị bỏ.
+# Mọi message gossip (TX, proposal, commit) chỉ chuyển tiếp cho tối đa GOSSIP_FANOUT peer
+# ngẫu nhiên → mỗi node gửi O(fanout), cả mạng O(N * fanout) thay vì O(N²) mỗi message.
+# Node bị sót được bù bằng đường khác (node_demo): vote gửi thẳng về proposer, proposer
+# gửi lại proposal cho node chưa vote, block commit bị sót lấy qua sync định kỳ.
+import os
+import random
+from collections import OrderedDict
+
+GOSSIP_FANOUT = 6          # số peer tối đa được chuyển tiếp mỗi message
+SEEN_CACHE_SIZE = 10_000   # số id message gần nhất được nhớ
+
+
+def new_message_id():
+    return os.urandom(16).hex()
+
+
+def pick_relays(peers, fanout=None, exclude=()):
+    """
+    Tập con ngẫu nhiên tối đa `fanout` (mặc định GOSSIP_FANOUT) phần tử của peers
+    (list (key, name)), bỏ qua các key trong exclude.
+    """
+    if fanout is None:
+        fanout = GOSSIP_FANOUT
+    candidates = [p for p in peers if p[0] not in exclude]
+    if len(candidates) <= fanout:
+        return candidates
+    return random.sample(candidates, fanout)
+
+
+class SeenCache:
+    """LRU các id message đã thấy. Không có lock: chỉ dùng trên event loop mạng."""
+
+    def __init__(self, size=SEEN_CACHE_SIZE):
+        self.size = size
+        self.ids = OrderedDict()
+
+    def add(self, msg_id):
+        """True nếu id mới (lần đầu thấy), False nếu là bản trùng."""
+        if msg_id in self.ids:
+            self.ids.move_to_end(msg_id)
+            return False
+        self.ids[msg_id] = None
+        if len(self.ids) > self.size:
+            self.ids.popitem(last=False)
+        return True
+
+    def __contains__(self, msg_id):
+        return msg_id in self.ids
@@ -0,0 +1,106 @@
+# ledger.py
+# Trạng thái số dư suy ra từ chuỗi: áp từng block vào map {tài khoản: số dư},
+# giữ undo record để reorg lùi lại được mà không phải đọc lại cả chuỗi.
+# Tài khoản = chuỗi "tên @ ip:port" như trong TX.
+import math
+
+from merkle import encode_leaf
+
+INITIAL_BALANCE = 100.0   # số dư sẵn có của tài khoản mới (demo)
+
+_MISSING = object()
+
+
+def block_reward(txs):
+    """Thưởng cho miner: tổng độ dài message các TX trong block (như PeerNode.reward cũ)."""
+    return sum(len(str(tx.get("message", ""))) for tx in txs)
+
+
+class Ledger:
+    def __init__(self):
+        self.balances = {}
+
+    def balance(self, account):
+        return self.balances.get(account, INITIAL_BALANCE)
+
+    def _get(self, changed, account):
+        return changed[account] if account in changed else self.balance(account)
+
+    def _apply_tx(self, changed, tx):
+        """Áp 1 TX lên `changed` (overlay số dư); False nếu tiêu quá số dư / TX sai."""
+        try:
+            amount = float(tx["amount"])
+            frm, to = tx["from"], tx["to"]
+        except (KeyError, TypeError, ValueError):
+            return False
+        if not (isinstance(frm, str) and isinstance(to, str)):
+            return False
+        # NaN / inf lọt qua mọi phép so sánh bên dưới → làm hỏng số dư
+        if not math.isfinite(amount) or amount <= 0 or self._get(changed, frm) < amount:
+            return False
+        changed[frm] = self._get(changed, frm) - amount
+        changed[to] = self._get(changed, to) + amount
+        return True
+
+    def _changes(self, txs, miner):
+        """
+        Số dư mới của các tài khoản bị chạm tới nếu áp các TX (sau khi cộng thưởng miner).
+        Trả về dict, hoặc None nếu có TX tiêu quá số dư / amount không hợp lệ / TX sai dạng.
+        """
+        if not all(isinstance(tx, dict) for tx in txs):
+            return None
+        if miner is not None and not isinstance(miner, str):
+            return None
+        changed = {}
+        if miner:
+            changed[miner] = self._get(changed, miner) + block_reward(txs)
+        for tx in txs:
+            if not self._apply_tx(changed, tx):
+                return None
+        return changed
+
+    def can_apply(self, tx):
+        """TX áp được một mình lên số dư hiện tại (đúng dạng, không tiêu quá số dư)."""
+        return isinstance(tx, dict) and self._apply_tx({}, tx)
+
+    def check_block(self, block):
+        """Block không làm tài khoản nào âm (không tiêu quá số dư)."""
+        return self._changes(block.transactions(), block.miner()) is not None
+
+    def apply_block(self, block):
+        """Áp block, trả về undo record; ValueError nếu block tiêu quá số dư."""
+        changed = self._changes(block.transactions(), block.miner())
+        if changed is None:
+            raise ValueError(f"Block #{block.index} tiêu quá số dư")
+        undo = {acct: self.balances.get(acct, _MISSING) for acct in changed}
+        self.balances.update(changed)
+        return undo
+
+    def revert_block(self, undo):
+        for acct, old in undo.items():
+            if old is _MISSING:
+                self.balances.pop(acct, None)
+            else:
+                self.balances[acct] = old
+
+    def select_txs(self, txs, limit, max_bytes=None):
+        """
+        Chọn (theo thứ tự) tối đa `limit` TX áp được liên tiếp lên số dư hiện tại.
+        max_bytes: tổng len(encode_leaf(tx)) + 1 của các TX chọn không vượt quá (TX không
+        vừa thì bỏ qua, TX nhỏ hơn phía sau vẫn được xét) – xem block.tx_budget.
+        Thưởng miner chỉ cộng vào sau nên không ảnh hưởng việc chọn.
+        """
+        chosen, changed, size = [], {}, 0
+        for tx in txs:
+            if len(chosen) >= limit:
+                break
+            if max_bytes is not None:
+                cost = len(encode_leaf(tx)) + 1
+                if size + cost > max_bytes:
+                    continue
+            # _apply_tx chỉ ghi vào changed khi TX hợp lệ
+            if self._apply_tx(changed, tx):
+                chosen.append(tx)
+                if max_bytes is not None:
+                    size += cost
+        return chosen
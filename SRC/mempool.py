@@ -0,0 +1,81 @@
+# mempool.py
+import threading
+import time
+from collections import OrderedDict
+
+from merkle import encode_leaf, hash_leaf
+
+MAX_MEMPOOL_TXS = 10_000   # số TX tối đa giữ trong mempool
+MEMPOOL_TX_TTL = 600.0     # giây: TX chờ lâu hơn (vẫn không đào được) bị bỏ
+
+
+def tx_id(tx):
+    """ID của TX = hash lá Merkle của TX (trùng với lá trong block)."""
+    return hash_leaf(encode_leaf(tx)).hex()
+
+
+class Mempool:
+    """Hàng đợi TX chờ đào (FIFO), bỏ TX trùng, TX quá hạn và (khi đầy) TX không hợp lệ."""
+
+    def __init__(self, max_size=MAX_MEMPOOL_TXS, ttl=MEMPOOL_TX_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.txs = OrderedDict()   # {tx_id: tx}, cũ → mới
+        self.added = {}            # {tx_id: thời điểm vào mempool}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.txs)
+
+    def add(self, tx, valid=None):
+        """
+        Trả về False nếu TX đã có hoặc mempool đầy.
+        Đầy → bỏ TX quá hạn, rồi các TX mà valid(tx) False (vd tiêu quá số dư hiện tại)
+        trước khi từ chối → TX rác không chiếm chỗ mãi mãi.
+        """
+        txid = tx_id(tx)
+        with self.lock:
+            if txid in self.txs:
+                return False
+            if len(self.txs) >= self.max_size:
+                self._expire(time.time())
+            if len(self.txs) >= self.max_size and valid is not None:
+                for old_id, old in list(self.txs.items()):
+                    if not valid(old):
+                        self._pop(old_id)
+            if len(self.txs) >= self.max_size:
+                return False
+            self.txs[txid] = tx
+            self.added[txid] = time.time()
+            return True
+
+    def expire(self):
+        with self.lock:
+            self._expire(time.time())
+
+    def _expire(self, now):
+        # txs theo thứ tự vào → dừng ở TX đầu tiên chưa quá hạn
+        for txid in list(self.txs):
+            if now - self.added[txid] < self.ttl:
+                break
+            self._pop(txid)
+
+    def _pop(self, txid):
+        self.added.pop(txid, None)
+        return self.txs.pop(txid, None)
+
+    def take(self, limit):
+        """Lấy (không xoá) tối đa `limit` TX cũ nhất để đóng block."""
+        with self.lock:
+            return [tx for _, tx in zip(range(limit), self.txs.values())]
+
+    def remove(self, txs):
+        """Xoá các TX đã nằm trong block được commit."""
+        with self.lock:
+            for tx in txs:
+                self._pop(tx_id(tx))
+
+    def clear(self):
+        with self.lock:
+            self.txs.clear()
+            self.added.clear()
@@ -0,0 +1,59 @@
+# merkle.py
+# Cây Merkle SHA-256 cho data của block.
+# Lá và nút trong được băm với tiền tố khác nhau (0x00 / 0x01) để không giả được lá từ nút.
+# Số nút lẻ ở 1 tầng: nút cuối được đẩy thẳng lên tầng trên (không nhân đôi).
+import hashlib
+import json
+
+
+def encode_leaf(obj):
+    """JSON chuẩn hoá (sort key, không khoảng trắng) → bytes của lá."""
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def hash_leaf(data):
+    return hashlib.sha256(b"\x00" + data).digest()
+
+
+def hash_node(left, right):
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def _next_level(level):
+    nxt = [hash_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        nxt.append(level[-1])
+    return nxt
+
+
+def merkle_root(leaf_hashes):
+    if not leaf_hashes:
+        return hashlib.sha256(b"").digest()
+    level = list(leaf_hashes)
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0]
+
+
+def merkle_proof(leaf_hashes, index):
+    """
+    Proof cho lá thứ `index`: list [hash_anh_em_hex, "L"|"R"] từ dưới lên
+    ("L" = anh em nằm bên trái).
+    """
+    proof = []
+    level = list(leaf_hashes)
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append([level[sibling].hex(), "L" if sibling < index else "R"])
+        level = _next_level(level)
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf_hash, proof, root):
+    h = leaf_hash
+    for sibling_hex, side in proof:
+        sibling = bytes.fromhex(sibling_hex)
+        h = hash_node(sibling, h) if side == "L" else hash_node(h, sibling)
+    return h == root
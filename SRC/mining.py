@@ -0,0 +1,192 @@
+# mining.py
+import hashlib
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# số nonce mỗi worker thử trước khi kiểm tra cờ dừng
+CHUNK_SIZE = 2000
+# chu kỳ (giây) kiểm tra cancel token và báo progress
+POLL_INTERVAL = 0.02
+
+# nonce nằm cuối header, u64 big-endian
+NONCE = struct.Struct(">Q")
+
+_stop_event = None
+_hash_counter = None
+
+# pool đào dùng lại giữa các block (như validation._pool): không fork / spawn mỗi round.
+# Cờ dừng + bộ đếm hash dùng chung, reset đầu mỗi lần đào → mỗi lúc chỉ 1 lần đào.
+_pool = None
+_pool_workers = 0
+_pool_shared = None   # (stop_event, hash_counter) đã truyền cho worker của _pool
+_pool_lock = threading.Lock()
+_job_lock = threading.Lock()
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def _target_bytes(target):
+    # so sánh 2 chuỗi byte big-endian cùng độ dài == so sánh số nguyên
+    return target.to_bytes(32, "big")
+
+
+class _Progress:
+    """Gọi callback progress(hashes, hashrate) tối đa 1 lần / POLL_INTERVAL."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.started = time.perf_counter()
+        self.last_report = self.started
+
+    def report(self, hashes, force=False):
+        if self.callback is None:
+            return
+        now = time.perf_counter()
+        if not force and now - self.last_report < POLL_INTERVAL:
+            return
+        self.last_report = now
+        elapsed = now - self.started
+        self.callback(hashes, hashes / elapsed if elapsed > 0 else 0.0)
+
+
+def serial_mine(prefix, target, cancel=None, progress=None):
+    """
+    Đào trên thread hiện tại.
+    prefix: bytes của header (không gồm nonce), chỉ hash 1 lần rồi copy() midstate.
+    target: hash (số nguyên big-endian) phải < target.
+    Trả về (nonce, hash) hoặc None nếu bị cancel.
+    """
+    target = _target_bytes(target)
+    pack_nonce = NONCE.pack
+    midstate = hashlib.sha256(prefix)
+    reporter = _Progress(progress)
+    nonce = 0
+    while cancel is None or not cancel.is_set():
+        for _ in range(CHUNK_SIZE):
+            h = midstate.copy()
+            h.update(pack_nonce(nonce))
+            digest = h.digest()
+            if digest < target:
+                reporter.report(nonce + 1, force=True)
+                return nonce, digest.hex()
+            nonce += 1
+        reporter.report(nonce)
+    # báo lần cuối (không throttle) → số hash cuối cùng chính xác
+    reporter.report(nonce, force=True)
+    return None
+
+
+def _init_worker(stop_event, hash_counter):
+    global _stop_event, _hash_counter
+    _stop_event = stop_event
+    _hash_counter = hash_counter
+
+
+def _search(prefix, target, start, step):
+    """
+    Worker: thử các nonce start, start+step, start+2*step, ...
+    Dừng khi tìm được hoặc khi worker khác đã thắng / bị cancel.
+    """
+    target = _target_bytes(target)
+    pack_nonce = NONCE.pack
+    midstate = hashlib.sha256(prefix)
+    nonce = start
+    while not _stop_event.is_set():
+        for i in range(CHUNK_SIZE):
+            h = midstate.copy()
+            h.update(pack_nonce(nonce))
+            digest = h.digest()
+            if digest < target:
+                _stop_event.set()
+                with _hash_counter.get_lock():
+                    _hash_counter.value += i + 1
+                return nonce, digest.hex()
+            nonce += step
+        with _hash_counter.get_lock():
+            _hash_counter.value += CHUNK_SIZE
+    return None
+
+
+def _get_pool(workers):
+    """Pool `workers` process tạo 1 lần, dùng lại cho mọi lần đào (đổi số worker → tạo lại)."""
+    global _pool, _pool_workers, _pool_shared
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            ctx = multiprocessing.get_context()
+            _pool_shared = (ctx.Event(), ctx.Value("Q", 0))
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=_pool_shared,
+            )
+            _pool_workers = workers
+        return _pool, _pool_shared
+
+
+def warm_up(workers=None):
+    """
+    Tạo sẵn pool + process worker. Gọi lúc khởi động, trước khi có thread khác (Tk,
+    asyncio...) → fork khi process còn 1 thread; round đào đầu không phải chờ tạo process.
+    """
+    pool, _shared = _get_pool(workers or default_workers())
+    pool.submit(default_workers).result()
+
+
+def _drop_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def parallel_mine(prefix, target, workers=None, cancel=None, progress=None):
+    """
+    Chia không gian nonce cho nhiều process (mỗi worker 1 bước nhảy riêng).
+    Worker đầu tiên tìm được nonce thắng, các worker còn lại bị dừng.
+    Trả về (nonce, hash) hoặc None nếu bị cancel.
+    """
+    workers = workers or default_workers()
+    with _job_lock:
+        pool, (stop_event, hash_counter) = _get_pool(workers)
+        stop_event.clear()
+        with hash_counter.get_lock():
+            hash_counter.value = 0
+        reporter = _Progress(progress)
+
+        try:
+            pending = {
+                pool.submit(_search, prefix, target, i, workers)
+                for i in range(workers)
+            }
+            result = None
+            while pending and result is None:
+                if cancel is not None and cancel.is_set():
+                    break
+                done, pending = wait(
+                    pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED
+                )
+                for f in done:
+                    if f.result() is not None:
+                        result = f.result()
+                        break
+                reporter.report(hash_counter.value)
+            stop_event.set()
+            # chờ worker còn lại dừng (≤ 1 chunk) trước khi lần đào sau clear cờ dừng
+            wait(pending)
+        except BrokenProcessPool:
+            _drop_pool()
+            raise
+
+    reporter.report(hash_counter.value, force=True)
+    return result
@@ -1,16 +1,46 @@
 # p2p_blockchain_gui.py / node_demo.py
+import asyncio
+import base64
 import socket
 import threading
 import json
+import math
+import os
 import time
 import tkinter as tk
 from tkinter import ttk, messagebox
 import platform
+import random
 
-from block import Block
+from block import Block, encode_payload, tx_budget
 from blockchain import Blockchain
-
-DIFFICULTY_PREFIX_ZERO = 3   # số lượng '0' đầu hash yêu cầu
+from blockstore import BlockStore
+from chainio import import_chunk, iter_chunks, iter_header_chunks
+from difficulty import hash_meets_target
+from gossip import SeenCache, new_message_id, pick_relays
+from ledger import block_reward
+from mempool import Mempool, tx_id
+from merkle import encode_leaf
+from mining import default_workers, warm_up
+from peer_net import (
+    REQUEST_TIMEOUT,
+    NetLoop,
+    PeerPool,
+    encode_message,
+    read_blocks,
+    read_message,
+    request,
+    write_blocks,
+)
+from snapshot import Snapshot
+from validation import warm_up as warm_up_validation
+
+MINING_WORKERS = default_workers()   # số process dùng để đào
+MAX_BLOCK_TXS = 100                  # số TX tối đa đóng vào 1 block
+DATA_DIR = "chaindata"               # thư mục lưu block (mỗi port 1 thư mục con)
+PRUNE_DEPTH = None                   # chỉ giữ data N block cuối trong RAM (None = giữ hết)
+VOTE_REPAIR_DELAY = 2.0              # giây chờ vote trước khi gửi lại proposal cho node chưa vote
+VOTE_REPAIR_ROUNDS = 3               # số lần gửi lại tối đa mỗi proposal
 
 # ================== CẤU HÌNH THEO MÁY ==================
 MY_ZERO_TIER_IP = "10.125.45.212"
@@ -33,8 +63,12 @@ class PeerNode:
         self.bootstrap_ip = tk.StringVar(value=BOOTSTRAP_ZERO_TIER_IP)
         self.bootstrap_port = tk.IntVar(value=5001)
 
-        # Trạng thái mạng
-        self.server_socket = None
+        # Trạng thái mạng: 1 event loop cho mọi kết nối vào / ra
+        self.net = NetLoop()
+        self.pool = PeerPool()
+        self.seen = SeenCache()   # id message gossip đã thấy (chỉ dùng trên event loop)
+        self.relay_tasks = set()  # giữ tham chiếu task chuyển tiếp (tránh bị GC giữa chừng)
+        self.server = None
         self.running = False
         self.joined = False
 
@@ -42,13 +76,20 @@ class PeerNode:
         self.peers = {}
 
         # Blockchain (ban đầu RỖNG, không có genesis trong chains)
-        self.blockchain = Blockchain()
+        self.blockchain = Blockchain(prune_depth=PRUNE_DEPTH)
 
         # Mining + consensus
-        self.pending_tx = None
+        # TX chờ đào; mỗi round lấy tối đa MAX_BLOCK_TXS TX vào pending_txs
+        self.mempool = Mempool()
+        self.pending_txs = []
         self.global_mining = False
         self.is_mining = False
         self.mining_lock = threading.Lock()
+        # mọi thao tác đổi chuỗi (commit, reorg, nhập chunk sync, snapshot) giữ lock này;
+        # handler chạy song song trên thread pool của loop. Thứ tự: chain_lock → mining_lock
+        self.chain_lock = threading.RLock()
+        # set() khi thua round → vòng đào đang chạy dừng ngay
+        self.mining_cancel = threading.Event()
 
         # Consensus: chỉ dùng cho block mà node này là miner
         self.current_proposed_block = None
@@ -63,17 +104,20 @@ class PeerNode:
         # Map hash → miner để hiển thị ở bảng blockchain
         self.block_miner = {}
 
-        # Bitcoin
-        self.btc = 0
-        self.checked_pending_tx = None
+        # Bitcoin: số dư lấy từ ledger của blockchain
+        self.checked_pending_txs = []
         self.btc_var = tk.StringVar(value="0 BTC")
 
+        # bảng blockchain: (chuỗi, số dư) chụp lần refresh gần nhất, đã hẹn vẽ lại trên thread Tk?
+        self._table_state = ([], 0.0)
+        self._table_pending = False
+
         # GUI
         self.build_gui()
         self.refresh_block_table()
 
-        # Luồng sync định kỳ
-        threading.Thread(target=self.periodic_sync_loop, daemon=True).start()
+        # Sync định kỳ (coroutine trên event loop mạng)
+        self.net.submit(self.periodic_sync_loop())
 
     # ============= Helper =============
     def node_id(self):
@@ -82,11 +126,12 @@ class PeerNode:
     def get_self_display(self):
         return f"{self.node_name.get()} @ {self.host_ip}:{self.port.get()}"
 
+    def my_balance(self):
+        return self.blockchain.ledger.balance(self.get_self_display())
+
     def reward(self, length):
-        """Thưởng BTC theo độ dài message."""
-        self.btc += length
-        self.btc_var.set(f"{self.btc} BTC")
-        self.log(f"🎁 Thưởng {length} BTC cho miner này (tổng: {self.btc} BTC)")
+        """Log thưởng BTC theo độ dài message (ledger đã cộng khi block vào chuỗi)."""
+        self.log(f"🎁 Thưởng {length} BTC cho miner này (số dư: {self.my_balance()} BTC)")
 
     def log(self, text):
         """Ghi log ra khung bên phải (trắng trên nền đen)."""
@@ -101,10 +146,11 @@ class PeerNode:
         self.root.after(0, _log)
 
     def reset_round_state(self):
-        self.pending_tx = None
-        self.checked_pending_tx = None
+        self.pending_txs = []
+        self.checked_pending_txs = []
         self.global_mining = False
         self.is_mining = False
+        self.mining_cancel.set()
         self.current_proposed_block = None
         self.current_block_hash = None
         self.block_votes.clear()
@@ -113,18 +159,8 @@ class PeerNode:
         self.status.set("Trạng thái: Idle")
 
     def validate_block_pow(self, block):
-        if not str(block.hash).startswith("0" * DIFFICULTY_PREFIX_ZERO):
-            return False
-
-        if not self.blockchain.chains:
-            # block đầu tiên: chỉ cần PoW
-            return True
-
-        last = self.blockchain.chains[-1]
-        if block.previous_hash != last.hash:
-            return False
-
-        return True
+        """Block đề xuất / commit phải nối đúng ngay sau tip (Blockchain.validate_next)."""
+        return self.blockchain.validate_next(block)
 
     # ============= GUI =============
     def build_gui(self):
@@ -263,63 +299,57 @@ class PeerNode:
 
         try:
             p = int(self.port.get())
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             # Lắng nghe trên tất cả interface (bao gồm ZeroTier)
-            self.server_socket.bind(("", p))
-            self.server_socket.listen(5)
+            self.server = self.net.serve(p, self.on_message)
         except Exception as e:
             messagebox.showerror("Error", str(e))
             return
 
+        # mở lại chuỗi đã lưu trên đĩa (nếu có) thay vì chờ WELCOME / SYNC
+        if self.blockchain.store is None:
+            store = BlockStore(os.path.join(DATA_DIR, f"node_{p}"))
+            self.locked(self.blockchain.attach_store, store)
+            if self.blockchain.height():
+                self.log(f"Nạp {self.blockchain.height()} block từ đĩa.")
+                self.refresh_block_table()
+
         self.running = True
-        threading.Thread(target=self.accept_loop, daemon=True).start()
         self.log(f"Node started tại {self.host_ip}:{p}")
 
-    def accept_loop(self):
-        while self.running:
-            try:
-                conn, addr = self.server_socket.accept()
-                threading.Thread(
-                    target=self.handle_client, args=(conn,), daemon=True
-                ).start()
-            except Exception:
-                break
-
-    def handle_client(self, conn):
-        try:
-            data = conn.recv(8192)
-            if not data:
-                return
-            msg = json.loads(data.decode())
-            self.handle_message(msg, conn)
-        except Exception as e:
-            print("Lỗi handle_client:", e)
-        finally:
-            conn.close()
-
-    def handle_message(self, msg, conn=None):
+    async def on_message(self, msg, reader, writer):
+        """
+        Coroutine xử lý 1 message đến trên event loop.
+        HELLO / SYNC_REQUEST trả lời luồng chuỗi ngay trên kết nối; các message còn lại
+        (xác thực block, đồng thuận – tốn CPU / có lock) chạy trong thread pool của loop
+        để không chặn các kết nối khác.
+        Message gossip (có "id"): bản trùng bị bỏ, bản mới qua kiểm tra rẻ (relay_ok) được
+        chuyển tiếp trước khi xử lý đầy đủ.
+        """
         t = msg.get("type")
-
+        if "id" in msg:
+            if not self.seen.add(msg["id"]):
+                return
+            if self.relay_ok(msg):
+                self._relay(msg, self._peer_items())
         if t == "HELLO":
             ip, port, name = msg["ip"], msg["port"], msg["name"]
             self.add_peer(ip, port, name)
-            reply = {
-                "type": "WELCOME",
-                "peers": self.list_peers(),
-                "blockchain": self.blockchain.to_list(),
-            }
-            if conn:
-                conn.send(json.dumps(reply).encode())
-            self.broadcast({"type": "NEW_PEER", "ip": ip, "port": port, "name": name})
-
-        elif t in ("WELCOME", "SYNC_RESPONSE"):
-            for p in msg["peers"]:
-                self.add_peer(p["ip"], p["port"], p["name"])
-            if self.blockchain.replace_chain(msg["blockchain"]):
-                self.refresh_block_table()
+            await self.send_chain(writer, "WELCOME", msg.get("tip"))
+            self.send_direct({"type": "NEW_PEER", "ip": ip, "port": port, "name": name})
+        elif t == "SYNC_REQUEST":
+            await self.send_chain(writer, "SYNC_RESPONSE", msg.get("tip"))
+        else:
+            await asyncio.to_thread(self.locked, self.handle_message, msg)
 
-        elif t == "NEW_PEER":
+    def locked(self, fn, *args):
+        """Gọi fn(*args) trong chain_lock (dùng với asyncio.to_thread)."""
+        with self.chain_lock:
+            return fn(*args)
+
+    def handle_message(self, msg):
+        t = msg.get("type")
+
+        if t == "NEW_PEER":
             self.add_peer(msg["ip"], msg["port"], msg["name"])
 
         elif t == "LEAVE":
@@ -328,11 +358,12 @@ class PeerNode:
                 self.log(f"Peer left: {self.peers[key]} @ {key[0]}:{key[1]}")
                 del self.peers[key]
                 self.refresh_peers()
+                self.net.submit(self._close_peer(*key))
 
         elif t == "NEW_TX":
             tx = msg["tx"]
             self.log(f"Nhận TX mới: {tx}")
-            self.start_mining_for_tx(tx)
+            self.add_transaction(tx)
 
         elif t == "BLOCK_PROPOSAL":
             self.handle_block_proposal(msg)
@@ -343,14 +374,106 @@ class PeerNode:
         elif t == "BLOCK_COMMIT":
             self.handle_block_commit(msg)
 
-        elif t == "SYNC_REQUEST":
-            reply = {
-                "type": "SYNC_RESPONSE",
-                "peers": self.list_peers(),
-                "blockchain": self.blockchain.to_list(),
-            }
-            if conn:
-                conn.send(json.dumps(reply).encode())
+    async def send_chain(self, writer, reply_type, tip):
+        """
+        Gửi reply dạng luồng: 1 frame message (type, peers, snapshot...), nếu có "headers"
+        thì luồng header theo chunk, rồi các block theo chunk – mỗi chunk 1 frame, không dựng
+        cả chuỗi trong RAM.
+        Đọc chuỗi / encode block (tốn CPU với block chưa có trong cache) chạy ngoài event loop.
+        """
+        fields, headers, start = await asyncio.to_thread(self.locked, self.chain_for_peer, tip)
+        reply = {"type": reply_type, "peers": self.list_peers(), **fields}
+        writer.write(encode_message(reply))
+        if headers is not None:
+            await write_blocks(
+                writer, self._locked_chunks(iter_header_chunks(self.blockchain, *headers))
+            )
+        await write_blocks(writer, self._locked_chunks(iter_chunks(self.blockchain, start)))
+
+    async def _locked_chunks(self, chunks):
+        """Duyệt generator chunk (chainio) với mỗi chunk được dựng trên thread pool (trong chain_lock)."""
+        while True:
+            part = await asyncio.to_thread(self.locked, next, chunks, None)
+            if part is None:
+                return
+            yield part
+
+    async def read_chain_reply(self, reader):
+        """
+        Đọc reply của send_chain: message đầu (peers, snapshot), luồng header (nếu có)
+        rồi nhập block theo chunk.
+        Kiểm tra block (tốn CPU) chạy ngoài event loop.
+        """
+        msg = await asyncio.wait_for(read_message(reader), REQUEST_TIMEOUT)
+        if msg is None:
+            return False
+        for p in msg["peers"]:
+            self.add_peer(p["ip"], p["port"], p["name"])
+        headers = []
+        if msg.get("headers"):
+            async for part in read_blocks(reader):
+                headers.extend(part)
+        loaded = "snapshot" in msg and await asyncio.to_thread(
+            self.locked, self.load_snapshot, msg["snapshot"], headers
+        )
+
+        replaced = None
+        async for part in read_blocks(reader):
+            ok, start = await asyncio.to_thread(self.locked, import_chunk, self.blockchain, part)
+            if start is not None and (replaced is None or start < replaced):
+                replaced = start
+            if not ok:
+                break
+        if replaced is not None:
+            await asyncio.to_thread(self.locked, self._forget_mined, replaced)
+        if replaced is not None or loaded:
+            await asyncio.to_thread(self.locked, self.refresh_block_table)
+        return True
+
+    def _forget_mined(self, height):
+        """Bỏ khỏi mempool các TX đã nằm trong block chuỗi chính từ height (gọi trong chain_lock)."""
+        for b in self.blockchain.blocks_from(height):
+            self.mempool.remove(b.transactions())
+
+    def chain_for_peer(self, tip):
+        """
+        Peer đã có block `tip` trong chuỗi của ta → chỉ gửi phần đuôi sau nó; tip nằm trên
+        nhánh phụ ta đã biết → gửi từ sau điểm rẽ nhánh (không gửi lại cả chuỗi).
+        Peer chưa có gì → gửi snapshot checkpoint (nếu có) + các block sau checkpoint.
+        Peer tụt sau phần ta đã prune → thêm luồng header từ sau tip của peer tới checkpoint.
+        Trả về (field thêm vào reply, khoảng height (start, end) header cần gửi hoặc None,
+        height bắt đầu gửi block).
+        """
+        pos = self.blockchain.fork_point(tip) if tip else None
+        start = pos + 1 if pos is not None else 0
+        if tip is not None and (pos is None or start >= self.blockchain.full_from):
+            return {}, None, start
+        snap = self.blockchain.latest_snapshot()
+        if snap is None:
+            return {}, None, start
+        fields = {"snapshot": base64.b64encode(snap.to_bytes()).decode()}
+        if pos is None:
+            return fields, None, snap.height
+        fields["headers"] = True
+        return fields, (start, snap.height), snap.height
+
+    def load_snapshot(self, encoded, headers=()):
+        """Chuỗi rỗng / tụt sau checkpoint → bắt đầu từ snapshot peer gửi thay vì replay."""
+        try:
+            snap = Snapshot.from_bytes(base64.b64decode(encoded))
+        except ValueError:
+            return False
+        if snap.height <= self.blockchain.height():
+            return False
+        if not self.blockchain.load_snapshot(snap, headers):
+            self.log("Snapshot nhận được không hợp lệ → bỏ qua.")
+            return False
+        self.log(f"Nạp snapshot tại height {snap.height} ({len(snap.balances)} tài khoản).")
+        return True
+
+    def tip_hash(self):
+        tip = self.blockchain.tip()
+        return tip.hash if tip else None
 
     # ----- Peers -----
     def add_peer(self, ip, port, name):
@@ -398,47 +521,50 @@ class PeerNode:
             self.leave_btn.config(state=tk.NORMAL)
             return
 
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(5)
-            s.connect((ip, port))
-            self.log("✅ TCP connect OK, gửi HELLO ...")
-
-            hello = {
-                "type": "HELLO",
-                "name": self.node_name.get(),
-                "ip": self.host_ip,
-                "port": self.port.get(),
-            }
-            s.send(json.dumps(hello).encode())
-
-            resp_raw = s.recv(8192)
-            if not resp_raw:
-                raise RuntimeError("Không nhận được WELCOME từ bootstrap")
-            resp = json.loads(resp_raw.decode())
-            self.handle_message(resp)
+        hello = {
+            "type": "HELLO",
+            "name": self.node_name.get(),
+            "ip": self.host_ip,
+            "port": self.port.get(),
+            "tip": self.tip_hash(),
+        }
+        # nhận chuỗi trên event loop mạng → GUI không bị chặn trong lúc join
+        self.net.submit(self._join(ip, port, hello))
 
-            self.joined = True
-            self.join_btn.config(state=tk.DISABLED)
-            self.leave_btn.config(state=tk.NORMAL)
-            self.log("✅ Join mạng thành công")
-            s.close()
+    async def _join(self, ip, port, hello):
+        try:
+            reader, writer = await request(ip, port, hello, timeout=5)
+            try:
+                self.log("✅ TCP connect OK, đã gửi HELLO ...")
+                if not await self.read_chain_reply(reader):
+                    raise RuntimeError("Không nhận được WELCOME từ bootstrap")
+            finally:
+                writer.close()
         except Exception as e:
             print("Join fail:", e)
             self.log(f"❌ JOIN ERROR: {repr(e)}")
-            messagebox.showerror("Error", "Join fail")
+            self.root.after(0, lambda: messagebox.showerror("Error", "Join fail"))
+            return
+
+        self.joined = True
+        self.root.after(0, self._show_joined)
+        self.log("✅ Join mạng thành công")
+
+    def _show_joined(self):
+        self.join_btn.config(state=tk.DISABLED)
+        self.leave_btn.config(state=tk.NORMAL)
 
     def leave_network(self):
-        self.broadcast(
-            {
-                "type": "LEAVE",
-                "ip": self.host_ip,
-                "port": self.port.get(),
-                "name": self.node_name.get(),
-            }
-        )
+        leave = {
+            "type": "LEAVE",
+            "ip": self.host_ip,
+            "port": self.port.get(),
+            "name": self.node_name.get(),
+        }
+        self.net.submit(self._leave(leave, self._peer_items()))
         self.peers.clear()
         self.refresh_peers()
+        self.mempool.clear()
         self.joined = False
         self.leave_btn.config(state=tk.DISABLED)
         self.join_btn.config(state=tk.NORMAL)
@@ -446,15 +572,83 @@ class PeerNode:
         self.reset_round_state()
 
     def broadcast(self, msg):
-        for (ip, port), name in list(self.peers.items()):
-            try:
-                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                s.settimeout(2)
-                s.connect((ip, port))
-                s.send(json.dumps(msg).encode())
-                s.close()
-            except Exception as e:
-                print(f"[BROADCAST] FAIL tới {name} @ {ip}:{port}: {e}")
+        """
+        Gọi được từ thread bất kỳ: việc gửi chạy trên event loop mạng, không chặn caller.
+        Trả về Future → DeliveryReport (caller cần biết kết quả thì .result()).
+        """
+        # chụp danh sách peer ngay (caller có thể sửa self.peers trước khi loop chạy tới)
+        return self.net.submit(self._gossip(self._new_gossip(msg), self._peer_items()))
+
+    def send_direct(self, msg, peers=None):
+        """
+        Gửi thẳng (không id → không chuyển tiếp) tới `peers` (mặc định mọi peer).
+        Dùng khi node gửi đã biết đúng người nhận: thành viên mạng, vote về proposer.
+        """
+        if peers is None:
+            peers = self._peer_items()
+        return self.net.submit(self._broadcast(msg, peers))
+
+    def _peer_items(self):
+        """Các peer (key, name) trừ chính node này (node bootstrap tự có trong self.peers)."""
+        me = (self.host_ip, self.port.get())
+        return [(key, name) for key, name in self.peers.items() if key != me]
+
+    def _new_gossip(self, msg):
+        """Gắn id + node gốc cho message phát đi từ node này."""
+        return {**msg, "id": new_message_id(), "origin": [self.host_ip, self.port.get()]}
+
+    async def _gossip(self, msg, peers):
+        self.seen.add(msg["id"])
+        return await self._broadcast(msg, pick_relays(peers))
+
+    def relay_ok(self, msg):
+        """
+        Kiểm tra rẻ trước khi chuyển tiếp: message có block thì block phải khớp block_hash,
+        có bits đúng retarget sau block cha (cha phải là block ta đã biết) và đạt PoW theo
+        bits đó → không lan block rác / giả / target dễ tự đặt ra cả mạng.
+        Kiểm tra đầy đủ (nối tip, số dư) vẫn ở handler.
+        """
+        if "block" not in msg:
+            return True
+        try:
+            block = Block.from_dict(msg["block"])
+            return (
+                block.hash == msg.get("block_hash")
+                and block.hash_matches_claim()
+                and block.bits == self.blockchain.next_bits_after(block.previous_hash)
+                and hash_meets_target(block.hash, block.bits)
+            )
+        except Exception:
+            # block sai dạng (field thiếu / sai kiểu) → không chuyển tiếp
+            return False
+
+    def _relay(self, msg, peers):
+        """Chuyển tiếp message gossip lần đầu thấy (không gửi lại cho node gốc / node vừa gửi)."""
+        exclude = {tuple(msg.get("origin") or ()), tuple(msg.get("via") or ())}
+        relays = pick_relays(peers, exclude=exclude)
+        if relays:
+            msg = {**msg, "via": [self.host_ip, self.port.get()]}
+            task = asyncio.create_task(self._broadcast(msg, relays))
+            self.relay_tasks.add(task)
+            task.add_done_callback(self.relay_tasks.discard)
+
+    async def _broadcast(self, msg, peers):
+        """Gửi trực tiếp tới đúng các peer trong `peers` (list (key, name))."""
+        names = dict(peers)
+        report = await self.pool.broadcast(names, msg)
+        for (ip, port), e in report.failed.items():
+            print(f"[BROADCAST] FAIL tới {names[(ip, port)]} @ {ip}:{port}: {e!r}")
+        if report.failed:
+            print(f"[BROADCAST] {msg.get('type')}: {report}")
+        return report
+
+    async def _close_peer(self, ip, port):
+        self.pool.close(ip, port)
+
+    async def _leave(self, msg, peers):
+        # node rời mạng biết mọi peer của nó → báo thẳng từng peer, không cần lan truyền
+        await self._broadcast(msg, peers)
+        self.pool.close_all()
 
     # ============= Transaction & Mining =============
     def send_transaction(self):
@@ -476,6 +670,12 @@ class PeerNode:
         except Exception:
             messagebox.showerror("Error", "Amount không hợp lệ")
             return
+        if not math.isfinite(amt) or amt <= 0:
+            messagebox.showerror("Error", "Amount không hợp lệ")
+            return
+        if amt > self.my_balance():
+            messagebox.showerror("Error", f"Số dư không đủ ({self.my_balance()} BTC)")
+            return
 
         peer = next(
             (
@@ -499,48 +699,82 @@ class PeerNode:
 
         self.log(f"Gửi TX: {tx}")
         self.broadcast({"type": "NEW_TX", "tx": tx})
-        self.start_mining_for_tx(tx)
+        self.add_transaction(tx)
+
+    def add_transaction(self, tx):
+        """
+        TX mới luôn vào mempool, kể cả khi đang có round đào.
+        Bỏ TX sai dạng, TX đã nằm trên chuỗi (NEW_TX đến muộn / bị phát lại) và TX quá
+        lớn, không vừa 1 block.
+        """
+        if not isinstance(tx, dict) or self.blockchain.has_tx(tx_id(tx)):
+            return
+        if len(encode_leaf(tx)) + 1 > tx_budget(self.get_self_display()):
+            return
+        if not self.mempool.add(tx, valid=self.blockchain.ledger.can_apply):
+            return
+        self.start_mining_round()
 
-    def start_mining_for_tx(self, tx):
+    def start_mining_round(self):
         with self.mining_lock:
-            if self.pending_tx is not None or self.global_mining:
+            if self.global_mining or len(self.mempool) == 0:
                 return
-            self.pending_tx = tx
-            # Lưu tx gốc để tính thưởng sau này (nếu mình là miner thắng)
-            self.checked_pending_tx = tx
             self.global_mining = True
 
-        self.log("TX mới, quá trình bắt đầu sau 5s...")
+        self.log(f"Mempool có {len(self.mempool)} TX, quá trình bắt đầu sau 5s...")
         threading.Thread(target=self._delayed_mining_start, daemon=True).start()
 
     def _delayed_mining_start(self):
         time.sleep(5)
         with self.mining_lock:
-            if not self.global_mining or self.pending_tx is None or self.is_mining:
+            if not self.global_mining or self.is_mining:
                 return
+            # TX đến trong 5s chờ cũng được đóng chung block;
+            # bỏ qua TX tiêu quá số dư (vẫn giữ trong mempool tới khi quá hạn, có thể hợp lệ sau)
+            self.mempool.expire()
+            # tổng kích thước TX vừa MAX_BLOCK_SIZE → block luôn gửi được trong 1 frame
+            self.pending_txs = self.blockchain.ledger.select_txs(
+                self.mempool.take(len(self.mempool)),
+                MAX_BLOCK_TXS,
+                max_bytes=tx_budget(self.get_self_display()),
+            )
+            if not self.pending_txs:
+                self.global_mining = False
+                return
+            # Lưu tx gốc để tính thưởng sau này (nếu mình là miner thắng)
+            self.checked_pending_txs = self.pending_txs
             self.is_mining = True
+            self.mining_cancel = threading.Event()
 
         self.status.set("Đang đào block...")
-        self.log("Bắt đầu đào block cho TX đang chờ.")
+        self.log(f"Bắt đầu đào block cho {len(self.pending_txs)} TX đang chờ.")
         self.mine_block()
 
     def mine_block(self):
         # Gói payload gồm: tx + miner để hiển thị ở blockchain
         payload = {
-            "tx": self.pending_tx,
+            "txs": self.pending_txs,
             "miner": self.get_self_display(),
         }
-        data = json.dumps(payload, ensure_ascii=False)
+        data = encode_payload(payload)
 
-        last_block = self.blockchain.chains[-1] if self.blockchain.chains else None
-        index = len(self.blockchain.chains)
+        last_block = self.blockchain.tip()
+        index = self.blockchain.height()
 
         self.log("⛏️ Đang đào block ...")
 
-        block = Block.create_block(last_block, data, index)
+        block = Block.create_block(
+            last_block,
+            data,
+            index,
+            bits=self.blockchain.next_bits(),
+            workers=MINING_WORKERS,
+            cancel=self.mining_cancel,
+            progress=self._mining_progress,
+        )
 
         with self.mining_lock:
-            if not self.global_mining:
+            if block is None or not self.global_mining:
                 self.log("❌ Block bị huỷ (node khác thắng trước)")
                 self.reset_round_state()
                 return
@@ -563,11 +797,18 @@ class PeerNode:
             "block": block.to_dict(),
             "miner": self.get_self_display(),
             "block_hash": block.hash,
+            # vote gửi thẳng về đây, không lan qua cả mạng
+            "proposer": [self.host_ip, self.port.get()],
         }
         self.broadcast(proposal)
 
-        if not self.peers:
+        if not self._peer_items():
             self._commit_current_block()
+        else:
+            self.net.submit(self._repair_proposal(proposal))
+
+    def _mining_progress(self, hashes, hashrate):
+        self.status.set(f"Đang đào block... {hashes} hash ({hashrate / 1000:.1f} kH/s)")
 
     # ============= Consensus: Proposal / Vote / Commit =============
     def handle_block_proposal(self, msg):
@@ -578,27 +819,30 @@ class PeerNode:
         block = Block.from_dict(block_dict)
         self.block_miner[bh] = miner
 
-        with self.mining_lock:
-            self.global_mining = False
-            self.is_mining = False
-            self.pending_tx = None
-            # mình đã thua cuộc, không dùng checked_pending_tx nữa
-            self.checked_pending_tx = None
-
         self.log(
             f"Nhận BLOCK_PROPOSAL: block #{block.index} do {miner} đào, "
-            f"hash={bh[:12]}..., dừng đào để xác thực."
+            f"hash={bh[:12]}..., xác thực."
         )
 
+        pow_ok = self.validate_block_pow(block)
+
+        # chỉ block hợp lệ mới được tính là proposal sớm nhất (block rác có timestamp nhỏ
+        # không chặn được block thật); nhận lại đúng proposal đó → vẫn là sớm nhất
         prev = getattr(block, "previous_hash", None)
         best = self.best_proposal_for_prev.get(prev)
-        if best is None or block.timestamp < best[0]:
+        is_best_ts = pow_ok and (best is None or best[1] == bh or block.timestamp < best[0])
+        if is_best_ts:
             self.best_proposal_for_prev[prev] = (block.timestamp, bh)
-            is_best_ts = True
-        else:
-            is_best_ts = False
 
-        pow_ok = self.validate_block_pow(block)
+        if pow_ok:
+            # chỉ dừng đào khi block hợp lệ (proposal rác không làm cả mạng ngừng đào)
+            with self.mining_lock:
+                self.global_mining = False
+                self.is_mining = False
+                self.mining_cancel.set()
+                self.pending_txs = []
+                # mình đã thua cuộc, không dùng checked_pending_txs nữa
+                self.checked_pending_txs = []
 
         accept = pow_ok and is_best_ts
         if not pow_ok:
@@ -615,7 +859,34 @@ class PeerNode:
             "from_name": self.node_name.get(),
             "accept": accept,
         }
-        self.broadcast(vote_msg)
+        ip, port = msg["proposer"]
+        self.send_direct(vote_msg, [((ip, port), miner)])
+
+    async def _repair_proposal(self, proposal):
+        """
+        Proposal chỉ lan theo fanout nên có thể sót node. Sau mỗi VOTE_REPAIR_DELAY giây,
+        nếu round chưa xong thì gửi thẳng proposal (không id) cho các peer chưa vote,
+        tối đa VOTE_REPAIR_ROUNDS lần.
+        """
+        for _ in range(VOTE_REPAIR_ROUNDS):
+            await asyncio.sleep(VOTE_REPAIR_DELAY)
+            missing = await asyncio.to_thread(
+                self.locked, self._missing_voters, proposal["block_hash"]
+            )
+            if not missing:
+                return
+            await self._broadcast(proposal, missing)
+
+    def _missing_voters(self, bh):
+        """Peer chưa vote cho block đang đề xuất `bh` ([] nếu round của bh đã kết thúc)."""
+        if self.current_block_hash != bh:
+            return []
+        votes = self.block_votes.get(bh, set())
+        return [
+            ((ip, port), name)
+            for (ip, port), name in self._peer_items()
+            if f"{ip}:{port}" not in votes
+        ]
 
     def handle_block_vote(self, msg):
         bh = msg["block_hash"]
@@ -643,56 +914,58 @@ class PeerNode:
         if voter_id not in votes:
             votes.add(voter_id)
 
-            total_nodes = len(self.peers) + 1
+            total_nodes = len(self._peer_items()) + 1
             self.log(
                 f"{voter_name} vote YES cho block #{block.index} "
                 f"(miner={miner_name}, hash={short_hash}...). "
                 f"YES hiện tại: {len(votes)}/{total_nodes}"
             )
 
-        total_nodes = len(self.peers) + 1
+        total_nodes = len(self._peer_items()) + 1
         if len(votes) >= total_nodes and bh not in self.block_has_no:
             self._commit_current_block()
 
     def _commit_current_block(self):
         """Được gọi CHỈ ở node đã đào ra block thắng."""
-        if self.current_proposed_block is None or self.current_block_hash is None:
-            return
+        with self.chain_lock:
+            if self.current_proposed_block is None or self.current_block_hash is None:
+                return
 
-        bh = self.current_block_hash
-        block = self.current_proposed_block
+            bh = self.current_block_hash
+            block = self.current_proposed_block
 
-        if not self.validate_block_pow(block):
-            self.log("Trước khi commit phát hiện block không hợp lệ, hủy.")
-            self.reset_round_state()
-            return
+            if not self.validate_block_pow(block):
+                self.log("Trước khi commit phát hiện block không hợp lệ, hủy.")
+                self.reset_round_state()
+                return
 
-        self.blockchain.appendBlock(block)
-        self.refresh_block_table()
+            self.blockchain.appendBlock(block)
+            self.refresh_block_table()
 
-        miner_name = self.block_miner.get(bh, self.get_self_display())
-        self.status.set("Block đã được toàn mạng chấp thuận")
+            miner_name = self.block_miner.get(bh, self.get_self_display())
+            self.status.set("Block đã được toàn mạng chấp thuận")
 
-        # ⭐ THƯỞNG BTC: chỉ node đào nhanh nhất và được mạng chấp nhận
-        if miner_name == self.get_self_display() and self.checked_pending_tx is not None:
-            msg_text = str(self.checked_pending_tx.get("message", ""))
-            reward_len = len(msg_text)
-            self.reward(reward_len)
+            # ⭐ THƯỞNG BTC: chỉ node đào nhanh nhất và được mạng chấp nhận
+            if miner_name == self.get_self_display() and self.checked_pending_txs:
+                self.reward(block_reward(self.checked_pending_txs))
 
-        self.log(
-            f"✅ Block #{block.index} (miner={miner_name}, "
-            f"hash={bh[:12]}...) được toàn mạng YES → commit & broadcast BLOCK_COMMIT."
-        )
+            self.log(
+                f"✅ Block #{block.index} (miner={miner_name}, "
+                f"hash={bh[:12]}...) được toàn mạng YES → commit & broadcast BLOCK_COMMIT."
+            )
 
-        commit_msg = {
-            "type": "BLOCK_COMMIT",
-            "block": block.to_dict(),
-            "miner": miner_name,
-            "block_hash": bh,
-        }
-        self.broadcast(commit_msg)
+            commit_msg = {
+                "type": "BLOCK_COMMIT",
+                "block": block.to_dict(),
+                "miner": miner_name,
+                "block_hash": bh,
+            }
+            self.broadcast(commit_msg)
 
-        self.reset_round_state()
+            self.mempool.remove(block.transactions())
+            self.reset_round_state()
+            # còn TX trong mempool → round mới
+            self.start_mining_round()
 
     def handle_block_commit(self, msg):
         """Các node KHÁC chỉ nhận block, không nhận thưởng."""
@@ -703,21 +976,28 @@ class PeerNode:
         block = Block.from_dict(block_dict)
         self.block_miner[bh] = miner
 
-        if not self.validate_block_pow(block):
-            self.log("Nhận BLOCK_COMMIT nhưng block không hợp lệ → bỏ qua.")
+        if self.blockchain.has_block(block.hash):
+            self.log("BLOCK_COMMIT: block đã tồn tại trong chain → bỏ qua.")
             return
 
-        if self.blockchain.chains:
-            last = self.blockchain.chains[-1]
-            if block.previous_hash != last.hash:
-                self.log("BLOCK_COMMIT: block không nối tiếp chuỗi hiện tại → bỏ qua.")
-                return
+        last = self.blockchain.tip()
+        if last is not None and block.previous_hash != last.hash:
+            # không nối vào tip: giữ lại trong block tree như nhánh phụ,
+            # chỉ đổi chuỗi chính nếu nhánh đó nặng hơn (nhiều work hơn)
+            if self.blockchain.replace_chain([block_dict]):
+                self._forget_mined(self.blockchain.replaced_from)
+                self.refresh_block_table()
+                self.log(f"BLOCK_COMMIT: nhánh của {miner} nặng hơn → reorg.")
+            else:
+                self.log("BLOCK_COMMIT: block không nối tiếp tip, nhánh không nặng hơn → giữ chuỗi chính.")
+            return
 
-            if last.hash == block.hash:
-                self.log("BLOCK_COMMIT: block đã tồn tại trong chain → bỏ qua.")
-                return
+        if not self.validate_block_pow(block):
+            self.log("Nhận BLOCK_COMMIT nhưng block không hợp lệ → bỏ qua.")
+            return
 
         self.blockchain.appendBlock(block)
+        self.mempool.remove(block.transactions())
         self.reset_round_state()
         self.refresh_block_table()
         self.status.set(f"Block của {miner} đã được commit.")
@@ -725,35 +1005,50 @@ class PeerNode:
             f"✅ BLOCK_COMMIT: thêm block #{block.index} của {miner}, "
             f"hash={bh[:12]}... vào chain."
         )
+        self.start_mining_round()
 
     # ============= SYNC =============
-    def periodic_sync_loop(self):
+    async def periodic_sync_loop(self):
         while True:
-            time.sleep(3)
-            if not self.joined or not self.peers:
+            await asyncio.sleep(3)
+            peers = self._peer_items()
+            if not self.joined or not peers:
                 continue
-            (ip, port), name = next(iter(self.peers.items()))
+            # peer ngẫu nhiên: block commit bị sót (gossip theo fanout) được bù từ nhiều nguồn
+            (ip, port), name = random.choice(peers)
             try:
-                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                s.settimeout(3)
-                s.connect((ip, port))
-                s.send(json.dumps({"type": "SYNC_REQUEST"}).encode())
-                data = s.recv(8192)
-                if data:
-                    msg = json.loads(data.decode())
-                    self.handle_message(msg)
-                s.close()
+                reader, writer = await request(
+                    ip, port, {"type": "SYNC_REQUEST", "tip": self.tip_hash()}, timeout=3
+                )
+                try:
+                    await self.read_chain_reply(reader)
+                finally:
+                    writer.close()
             except Exception as e:
                 print(f"[SYNC] Lỗi sync với {name} @ {ip}:{port}: {e}\n")
 
     def refresh_block_table(self):
+        """
+        Gọi được từ thread bất kỳ: chụp chuỗi + số dư (trong chain_lock) rồi hẹn vẽ lại bảng
+        trên thread Tk; nhiều lần refresh trước khi kịp vẽ chỉ vẽ 1 lần với bản chụp mới nhất.
+        """
+        with self.chain_lock:
+            self._table_state = (list(self.blockchain.chains), self.my_balance())
+        if not self._table_pending:
+            self._table_pending = True
+            self.root.after(0, self._draw_block_table)
+
+    def _draw_block_table(self):
         """Cập nhật bảng blockchain: có thêm cột miner, data tự giãn rộng theo độ dài tx."""
+        self._table_pending = False
+        blocks, balance = self._table_state
         for row in self.block_tree.get_children():
             self.block_tree.delete(row)
+        self.btc_var.set(f"{balance} BTC")
 
         max_data_len = 0
 
-        for b in self.blockchain.chains:
+        for b in blocks:
             miner_name = self.block_miner.get(b.hash, "")
 
             # cố gắng parse payload để lấy miner + tx đẹp hơn
@@ -762,16 +1057,19 @@ class PeerNode:
                 payload = json.loads(b.data)
                 if isinstance(payload, dict):
                     miner_name = payload.get("miner", miner_name)
-                    tx = payload.get("tx", None)
-                    if isinstance(tx, dict):
+                    txs = b.transactions()
+                    if txs:
                         # chỉ show from/to/amount cho gọn
-                        frm = tx.get("from", "") or ""
-                        to = tx.get("to", "") or ""
-                        amt = tx.get("amount", "")
-                        msg = tx.get("message", "")
-                        display_data = f"{frm} -> {to} | {amt}$ | {msg}"
+                        parts = []
+                        for tx in txs:
+                            frm = tx.get("from", "") or ""
+                            to = tx.get("to", "") or ""
+                            amt = tx.get("amount", "")
+                            msg = tx.get("message", "")
+                            parts.append(f"{frm} -> {to} | {amt}$ | {msg}")
+                        display_data = " ; ".join(parts)
                     else:
-                        display_data = str(tx)
+                        display_data = str(payload.get("tx", None))
             except Exception:
                 pass
 
@@ -797,6 +1095,8 @@ class PeerNode:
 
 
 if __name__ == "__main__":
+    warm_up(MINING_WORKERS)
+    warm_up_validation()
     root = tk.Tk()
     app = PeerNode(root)
     root.mainloop()
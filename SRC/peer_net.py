@@ -0,0 +1,284 @@
+# peer_net.py
+# Lõi mạng asyncio: 1 event loop (trên 1 thread riêng) phục vụ mọi kết nối vào / ra
+# của node, thay cho 1 OS thread mỗi kết nối.
+# Giao thức dạng frame: kind u8 | độ dài u32 | payload
+#   FRAME_MESSAGE  payload = 1 message JSON (có "type")
+#   FRAME_BLOCKS   payload = 1 chunk block dạng JSON Lines (luồng chuỗi)
+#   FRAME_END      hết luồng block (payload rỗng)
+#   FRAME_PING     keepalive của kết nối nhàn rỗi (payload rỗng, bên nhận bỏ qua)
+# Nhiều frame nối tiếp trên 1 kết nối; reply (nếu có) đi ngược lại trên cùng kết nối.
+# Message 1 chiều (broadcast) đi qua PeerPool: mỗi peer 1 kết nối dùng lại lâu dài.
+import asyncio
+import json
+import socket
+import struct
+import threading
+import time
+
+CONNECT_TIMEOUT = 2.0              # giây chờ connect / gửi xong 1 message
+REQUEST_TIMEOUT = 5.0              # giây chờ phần đầu reply của 1 request
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+KEEPALIVE_INTERVAL = 15.0          # giây nhàn rỗi trước khi ping kết nối trong pool
+BROADCAST_DEADLINE = 2.0           # giây tối đa cho 1 peer trong 1 lần broadcast
+
+FRAME_HEADER = struct.Struct(">BI")
+FRAME_MESSAGE = 1
+FRAME_BLOCKS = 2
+FRAME_END = 3
+FRAME_PING = 4
+
+
+class NetLoop:
+    """Event loop chạy nền; code ở thread khác (GUI, đào) gửi coroutine vào qua submit."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        """Chạy coroutine trên loop từ thread bất kỳ → concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def serve(self, port, on_message):
+        """
+        Mở server (chặn tới khi bind xong, lỗi bind được raise ở đây).
+        on_message(msg, reader, writer): coroutine xử lý 1 message đến; các message trên
+        cùng kết nối được xử lý lần lượt.
+        """
+        async def handle(reader, writer):
+            try:
+                while True:
+                    msg = await read_message(reader)
+                    if msg is None:
+                        break
+                    await on_message(msg, reader, writer)
+            except Exception as e:
+                print("Lỗi handle_client:", e)
+            finally:
+                writer.close()
+
+        async def start():
+            return await asyncio.start_server(handle, host="", port=port, reuse_address=True)
+
+        return self.submit(start()).result()
+
+
+# ----- frame -----
+def encode_frame(kind, payload=b""):
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+def encode_message(msg):
+    return encode_frame(FRAME_MESSAGE, json.dumps(msg).encode())
+
+
+async def read_frame(reader):
+    """
+    (kind, payload) của frame kế tiếp, None nếu kết nối đóng giữa 2 frame.
+    Đọc thẳng từ buffer nội bộ của StreamReader (dùng lại giữa các lần đọc).
+    """
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise
+        return None
+    kind, n = FRAME_HEADER.unpack(header)
+    if n > MAX_FRAME_SIZE:
+        raise ValueError(f"frame quá lớn ({n} byte)")
+    return kind, await reader.readexactly(n)
+
+
+async def read_message(reader):
+    """Message JSON kế tiếp (bỏ qua ping), None nếu kết nối đã đóng."""
+    frame = await read_frame(reader)
+    while frame is not None and frame[0] == FRAME_PING:
+        frame = await read_frame(reader)
+    if frame is None:
+        return None
+    kind, payload = frame
+    if kind != FRAME_MESSAGE:
+        raise ValueError(f"chờ message, nhận frame loại {kind}")
+    return json.loads(payload)
+
+
+async def write_blocks(writer, chunks):
+    """
+    Gửi luồng block: mỗi chunk JSONL 1 frame, chờ drain giữa các frame, rồi FRAME_END.
+    chunks: async iterable bytes (chunk được dựng ngoài event loop).
+    """
+    async for part in chunks:
+        writer.write(encode_frame(FRAME_BLOCKS, part))
+        await writer.drain()
+    writer.write(encode_frame(FRAME_END))
+    await writer.drain()
+
+
+async def read_blocks(reader):
+    """Async generator: list block dict của từng frame FRAME_BLOCKS tới FRAME_END."""
+    while True:
+        frame = await read_frame(reader)
+        if frame is None:
+            raise ConnectionError("luồng block bị ngắt giữa chừng")
+        kind, payload = frame
+        if kind == FRAME_END:
+            return
+        if kind != FRAME_BLOCKS:
+            raise ValueError(f"chờ block, nhận frame loại {kind}")
+        yield [json.loads(line) for line in payload.splitlines() if line.strip()]
+
+
+# ----- kết nối ra -----
+async def open_peer(ip, port, timeout=CONNECT_TIMEOUT):
+    return await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+
+
+class PeerPool:
+    """
+    Kết nối ra dùng lại: mỗi peer (ip, port) 1 kết nối mở lâu dài cho message 1 chiều.
+    Kết nối hỏng (peer đóng / lỗi ghi) bị bỏ và mở lại 1 lần ngay trong send.
+    Kết nối nhàn rỗi quá KEEPALIVE_INTERVAL được ping để phát hiện peer chết sớm
+    (và giữ NAT / firewall không cắt kết nối). Chỉ dùng trên event loop của NetLoop.
+    """
+
+    def __init__(self, keepalive=KEEPALIVE_INTERVAL):
+        self.keepalive = keepalive
+        self.conns = {}     # (ip, port) → (reader, writer)
+        self.locks = {}     # (ip, port) → asyncio.Lock: ghi tuần tự trên 1 kết nối
+        self.last_used = {}
+        self._keepalive_task = None
+
+    async def send(self, ip, port, msg, timeout=CONNECT_TIMEOUT):
+        """Gửi 1 message qua kết nối của peer; raise nếu cả lần mở lại cũng lỗi."""
+        key = (ip, port)
+        data = encode_message(msg)
+        async with self.locks.setdefault(key, asyncio.Lock()):
+            try:
+                await self._write(key, data, timeout, reuse=True)
+            except (OSError, asyncio.TimeoutError):
+                # kết nối cũ có thể đã chết từ trước → thử lại với kết nối mới
+                await self._write(key, data, timeout, reuse=False)
+
+    async def _write(self, key, data, timeout, reuse):
+        conn = self.conns.get(key) if reuse else None
+        if conn is None or _is_dead(conn):
+            self._drop(key)
+            conn = await self._connect(key, timeout)
+        try:
+            conn[1].write(data)
+            await asyncio.wait_for(conn[1].drain(), timeout)
+        except BaseException:
+            self._drop(key)
+            raise
+        self.last_used[key] = time.monotonic()
+
+    async def _connect(self, key, timeout):
+        conn = await open_peer(*key, timeout)
+        sock = conn[1].get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.conns[key] = conn
+        if self._keepalive_task is None:
+            self._keepalive_task = asyncio.create_task(self._keepalive_loop())
+        return conn
+
+    def _drop(self, key):
+        conn = self.conns.pop(key, None)
+        self.last_used.pop(key, None)
+        if conn is not None:
+            conn[1].close()
+
+    async def broadcast(self, peers, msg, deadline=BROADCAST_DEADLINE):
+        """
+        Gửi song song tới mọi peer (iterable (ip, port)), mỗi peer có hạn riêng `deadline`
+        → tổng thời gian ≈ peer khoẻ chậm nhất, không phải tổng timeout.
+        Trả về DeliveryReport.
+        """
+        peers = list(peers)
+
+        async def one(key):
+            start = time.monotonic()
+            await asyncio.wait_for(self.send(*key, msg, timeout=deadline), deadline)
+            return time.monotonic() - start
+
+        results = await asyncio.gather(*(one(key) for key in peers), return_exceptions=True)
+        report = DeliveryReport()
+        for key, res in zip(peers, results):
+            if isinstance(res, BaseException):
+                report.failed[key] = res
+            else:
+                report.delivered[key] = res
+        return report
+
+    def close(self, ip, port):
+        self._drop((ip, port))
+
+    def close_all(self):
+        for key in list(self.conns):
+            self._drop(key)
+
+    async def _keepalive_loop(self):
+        ping = encode_frame(FRAME_PING)
+        while True:
+            await asyncio.sleep(self.keepalive)
+            now = time.monotonic()
+            for key, conn in list(self.conns.items()):
+                if now - self.last_used.get(key, 0) < self.keepalive:
+                    continue
+                lock = self.locks.setdefault(key, asyncio.Lock())
+                if lock.locked():
+                    continue
+                async with lock:
+                    if self.conns.get(key) is not conn:
+                        continue
+                    try:
+                        if _is_dead(conn):
+                            raise ConnectionError("peer đã đóng kết nối")
+                        conn[1].write(ping)
+                        await asyncio.wait_for(conn[1].drain(), CONNECT_TIMEOUT)
+                        self.last_used[key] = time.monotonic()
+                    except (OSError, asyncio.TimeoutError):
+                        self._drop(key)
+
+
+class DeliveryReport:
+    """Kết quả 1 lần broadcast: peer → thời gian gửi (giây) / lỗi."""
+
+    def __init__(self):
+        self.delivered = {}
+        self.failed = {}
+
+    def ok(self):
+        return not self.failed
+
+    def __str__(self):
+        slowest = max(self.delivered.values(), default=0.0)
+        return (
+            f"{len(self.delivered)}/{len(self.delivered) + len(self.failed)} peer"
+            f" (chậm nhất {slowest * 1000:.0f} ms)"
+        )
+
+
+def _is_dead(conn):
+    reader, writer = conn
+    # pool không đọc reply → buffer luôn rỗng, at_eof() = peer đã đóng phía bên kia
+    return writer.is_closing() or reader.at_eof()
+
+
+async def send_message(ip, port, msg, timeout=CONNECT_TIMEOUT):
+    """Gửi 1 message không chờ reply trên kết nối riêng (mở rồi đóng ngay)."""
+    _reader, writer = await open_peer(ip, port, timeout)
+    try:
+        writer.write(encode_message(msg))
+        await asyncio.wait_for(writer.drain(), timeout)
+    finally:
+        writer.close()
+
+
+async def request(ip, port, msg, timeout=CONNECT_TIMEOUT):
+    """Gửi message rồi trả về (reader, writer) để đọc reply; caller tự đóng writer."""
+    reader, writer = await open_peer(ip, port, timeout)
+    writer.write(encode_message(msg))
+    await asyncio.wait_for(writer.drain(), timeout)
+    return reader, writer
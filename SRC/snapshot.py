@@ -0,0 +1,138 @@
+# snapshot.py
+# Snapshot trạng thái tại checkpoint: header các block cuối tới checkpoint (đủ cho
+# retarget + nối block tiếp theo) + map số dư. Node mới nạp snapshot rồi chỉ kiểm tra
+# các block sau checkpoint, không phải replay toàn bộ lịch sử.
+# Định dạng nhị phân (big-endian):
+#   magic 8B | height u64 | work 32B | số header u32 | header (HEADER_SIZE) ...
+#   | số tài khoản u32 | mỗi tài khoản: độ dài tên u16 | tên utf-8 | số dư f64
+import os
+import struct
+
+from block import HEADER_SIZE, Block
+from blocktree import block_work
+from difficulty import MAX_TARGET, RETARGET_WINDOW, hash_meets_target, target_to_bits
+
+SNAPSHOT_INTERVAL = 1000   # checkpoint mỗi N block
+SNAPSHOT_DEPTH = 100       # checkpoint phải sâu ít nhất N block (tránh bị reorg)
+SNAPSHOT_FILE = "snapshot.dat"   # snapshot mới nhất của node (để gửi cho peer)
+BASE_FILE = "base.dat"           # snapshot mà chuỗi của node bắt đầu từ đó
+
+SNAPSHOT_MAGIC = b"SNAP0001"
+SNAPSHOT_HEADER = struct.Struct(">8sQ32sI")
+COUNT = struct.Struct(">I")
+NAME_LEN = struct.Struct(">H")
+BALANCE = struct.Struct(">d")
+
+
+def checkpoint_for(height):
+    """Checkpoint mới nhất đủ sâu với chuỗi `height` block (0 = chưa có)."""
+    depth_ok = height - SNAPSHOT_DEPTH
+    return max(0, depth_ok - depth_ok % SNAPSHOT_INTERVAL)
+
+
+class Snapshot:
+    def __init__(self, height, work, headers, balances):
+        self.height = height       # số block tính tới checkpoint (= index tip + 1)
+        self.work = work           # work tích luỹ tới tip
+        self.headers = headers     # Block chỉ có header (data=None), cũ → mới
+        self.balances = balances   # {tài khoản: số dư} sau block tip
+        self._encoded = None       # cache to_bytes (snapshot không đổi sau khi dựng)
+
+    def tip(self):
+        return self.headers[-1]
+
+    def base_work(self):
+        """Work tích luỹ trước header đầu tiên (cho gốc của block tree)."""
+        return self.work - sum(block_work(h.bits) for h in self.headers)
+
+    def min_work(self):
+        """
+        Work chắc chắn có tới tip, chỉ từ dữ liệu kiểm chứng được: work các header +
+        mỗi block trước đó ít nhất work của target dễ nhất. `work` do peer ghi thì không
+        kiểm chứng được (có thể bị thổi phồng để node mới không bao giờ reorg).
+        """
+        below = self.height - len(self.headers)
+        return below * block_work(target_to_bits(MAX_TARGET)) + sum(
+            block_work(h.bits) for h in self.headers
+        )
+
+    def verify(self):
+        """
+        Kiểm tra tính nhất quán của header: index liên tục, nối hash, đạt PoW.
+        Số dư không có cam kết trong header → tin peer gửi snapshot (checkpoint tin cậy).
+        """
+        if not self.headers or len(self.headers) > RETARGET_WINDOW + 1:
+            return False
+        if self.tip().index != self.height - 1:
+            return False
+        prev = None
+        for h in self.headers:
+            if prev is not None and (h.index != prev.index + 1 or h.previous_hash != prev.hash):
+                return False
+            if not hash_meets_target(h.hash, h.bits):
+                return False
+            prev = h
+        return self.base_work() >= 0
+
+    def to_bytes(self):
+        if self._encoded is None:
+            self._encoded = self._encode()
+        return self._encoded
+
+    def _encode(self):
+        parts = [
+            SNAPSHOT_HEADER.pack(
+                SNAPSHOT_MAGIC, self.height, self.work.to_bytes(32, "big"), len(self.headers)
+            )
+        ]
+        parts.extend(h.header_bytes() for h in self.headers)
+        parts.append(COUNT.pack(len(self.balances)))
+        for acct, bal in self.balances.items():
+            name = acct.encode()
+            parts.append(NAME_LEN.pack(len(name)) + name + BALANCE.pack(bal))
+        return b"".join(parts)
+
+    @staticmethod
+    def from_bytes(buf):
+        """ValueError nếu dữ liệu hỏng."""
+        mv = memoryview(buf)
+        try:
+            magic, height, work, n = SNAPSHOT_HEADER.unpack_from(mv, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError("snapshot: sai magic")
+            offset = SNAPSHOT_HEADER.size
+            headers = []
+            for _ in range(n):
+                headers.append(Block.from_header(mv, offset))
+                offset += HEADER_SIZE
+            (count,) = COUNT.unpack_from(mv, offset)
+            offset += COUNT.size
+            balances = {}
+            for _ in range(count):
+                (k,) = NAME_LEN.unpack_from(mv, offset)
+                offset += NAME_LEN.size
+                name = str(mv[offset:offset + k], "utf-8")
+                offset += k
+                (balances[name],) = BALANCE.unpack_from(mv, offset)
+                offset += BALANCE.size
+        except struct.error as e:
+            raise ValueError(f"snapshot hỏng: {e}") from e
+        return Snapshot(height, int.from_bytes(work, "big"), headers, balances)
+
+    def save(self, path):
+        """Ghi qua file tạm rồi rename → không bao giờ để lại snapshot ghi dở."""
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.to_bytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path):
+        """None nếu chưa có file."""
+        try:
+            with open(path, "rb") as f:
+                return Snapshot.from_bytes(f.read())
+        except FileNotFoundError:
+            return None
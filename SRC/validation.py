@@ -0,0 +1,158 @@
+# validation.py
+# Kiểm tra đầy đủ các block nhận từ peer:
+#   - tuần tự (rẻ, chỉ dùng field header): index liên tục, previous_hash nối chuỗi,
+#     bits đúng theo retarget, timestamp > trung vị các block trước và không ở tương lai xa
+#   - song song (tốn CPU): data đúng dạng chuẩn, block ≤ MAX_BLOCK_SIZE, data_root tính lại từ data, hash khớp nội dung + hash gửi kèm,
+#     hash < target  → chia chunk cho process pool
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from block import Block
+from difficulty import (
+    MEDIAN_TIME_SPAN,
+    RETARGET_WINDOW,
+    hash_meets_target,
+    next_bits,
+    timestamp_ok,
+)
+from mining import default_workers
+
+# ~120 µs kiểm tra / block, 1 task qua pool tốn ~0.8 ms → task ít nhất 64 block
+MIN_TASK_BLOCKS = 64
+# ít block hơn → kiểm tra ngay trong process hiện tại. Phải ≤ chainio.CHUNK_BLOCKS:
+# sync nhập từng chunk, chunk nhỏ hơn ngưỡng thì không bao giờ chạy song song.
+PARALLEL_THRESHOLD = 2 * MIN_TASK_BLOCKS
+
+# lỗi khi đọc field sai kiểu / sai dạng từ peer (data=5, timestamp là chuỗi, hash không
+# phải hex, thiếu key, số vượt u64...) → block không hợp lệ, không phải lỗi của node
+MALFORMED = (ValueError, TypeError, AttributeError, KeyError, OverflowError, struct.error)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=default_workers())
+        return _pool
+
+
+def warm_up():
+    """
+    Tạo sẵn pool kiểm tra block. Gọi lúc khởi động, trước khi có thread khác (Tk,
+    asyncio...) → fork khi process còn 1 thread (như mining.warm_up).
+    """
+    if default_workers() > 1:
+        _get_pool().submit(default_workers).result()
+
+
+def check_chunk(block_dicts):
+    """
+    Worker: kiểm tra hash + PoW của 1 chunk.
+    Trả về list (hash, data_root) hoặc vị trí (int) block hỏng đầu tiên trong chunk.
+    """
+    out = []
+    for i, bd in enumerate(block_dicts):
+        try:
+            b = Block.from_dict(bd)
+            if not b.data_ok() or not b.size_ok():
+                return i
+            h = b.calculate_hash()
+            if bd.get("hash") not in (None, h) or not hash_meets_target(h, b.bits):
+                return i
+            out.append((h, b.data_root))
+        except MALFORMED:
+            return i
+    return out
+
+
+class _Header:
+    """Chỉ các field retarget cần (tránh dựng Block trong vòng tuần tự)."""
+    __slots__ = ("timestamp", "bits")
+
+    def __init__(self, timestamp, bits):
+        self.timestamp = timestamp
+        self.bits = bits
+
+
+def check_linkage(block_dicts, parent, recent):
+    """
+    Kiểm tra tuần tự: index liên tục, previous_hash trỏ đúng block trước, bits đúng retarget,
+    timestamp hợp lệ (difficulty.timestamp_ok).
+    parent: block cha của block đầu (None = block đầu chuỗi),
+    recent: các block cuối chuỗi tới parent (cho retarget).
+    Dùng hash gửi kèm để nối chuỗi – hash thật được đối chiếu ở bước song song.
+    Field sai kiểu / sai dạng (MALFORMED) → False.
+    """
+    try:
+        return _check_linkage(block_dicts, parent, recent)
+    except MALFORMED:
+        return False
+
+
+def _check_linkage(block_dicts, parent, recent):
+    span = max(RETARGET_WINDOW + 1, MEDIAN_TIME_SPAN)
+    window = list(recent[-span:])
+    now = time.time()
+    index = parent.index + 1 if parent else 0
+    prev_hash = parent.hash if parent else None
+    for bd in block_dicts:
+        if bd["index"] != index or bd["previous_hash"] != prev_hash:
+            return False
+        if bd.get("bits") != next_bits(window):
+            return False
+        if not timestamp_ok(bd["timestamp"], window, now):
+            return False
+        prev_hash = bd.get("hash")
+        if prev_hash is None:
+            return False
+        window.append(_Header(bd["timestamp"], bd["bits"]))
+        del window[:-span]
+        index += 1
+    return True
+
+
+def validate_blocks(block_dicts, parent=None, recent=()):
+    """
+    Kiểm tra đầy đủ 1 đoạn block nối sau `parent`.
+    Trả về list Block đã kiểm chứng (hash, data_root gán sẵn) hoặc None nếu không hợp lệ.
+    """
+    if not check_linkage(block_dicts, parent, recent):
+        return None
+
+    if len(block_dicts) < PARALLEL_THRESHOLD or default_workers() == 1:
+        results = [check_chunk(block_dicts)]
+    else:
+        pool = _get_pool()
+        # chia đều cho các worker (1 chunk sync 256 block → 4 task 64 block)
+        size = max(MIN_TASK_BLOCKS, -(-len(block_dicts) // default_workers()))
+        futures = [
+            pool.submit(check_chunk, block_dicts[i:i + size])
+            for i in range(0, len(block_dicts), size)
+        ]
+        results = []
+        try:
+            for f in futures:
+                res = f.result()
+                if isinstance(res, int):
+                    return None
+                results.append(res)
+        finally:
+            # có chunk hỏng / lỗi → huỷ các chunk chưa chạy
+            for f in futures:
+                f.cancel()
+
+    blocks = []
+    for res in results:
+        if isinstance(res, int):
+            return None
+        for h, root in res:
+            b = Block.from_dict(block_dicts[len(blocks)])
+            b.hash = h
+            b._data_root = root
+            blocks.append(b)
+    return blocks
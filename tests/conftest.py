@@ -0,0 +1,18 @@
+# conftest.py
+# Module của repo nằm phẳng trong SRC/ (chạy trực tiếp từ đó) → thêm vào sys.path cho test.
+import os
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SRC")
+sys.path.insert(0, SRC)
+
+
+@pytest.fixture
+def small_checkpoints(monkeypatch):
+    """Checkpoint mỗi 50 block, sâu 10 block → test snapshot chỉ cần chuỗi vài trăm block."""
+    import snapshot
+
+    monkeypatch.setattr(snapshot, "SNAPSHOT_INTERVAL", 50)
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DEPTH", 10)
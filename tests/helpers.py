@@ -0,0 +1,53 @@
+# helpers.py
+# Dựng chuỗi nhỏ cho test: timestamp cách nhau MAX_ADJUST * TARGET_BLOCK_TIME nên retarget
+# nhanh về target dễ nhất (vài hash / block); chuỗi bắt đầu trong quá khứ để block nối thêm
+# không bị coi là ở tương lai.
+import itertools
+import time
+
+from block import Block, encode_payload
+from blockchain import Blockchain
+from difficulty import MAX_ADJUST, TARGET_BLOCK_TIME
+
+STEP = MAX_ADJUST * TARGET_BLOCK_TIME
+START = time.time() - 100_000 * STEP
+
+_seq = itertools.count()
+
+
+def tx(frm="A", to="B", amount=1.0):
+    """TX mới, không trùng TX nào khác (seq)."""
+    return {"from": frm, "to": to, "amount": amount, "seq": next(_seq)}
+
+
+def payload(txs=(), miner="M"):
+    return encode_payload({"txs": list(txs), "miner": miner})
+
+
+def next_block(bc, data=None, **fields):
+    """Block đã đào nối sau tip của bc (chưa thêm vào chuỗi); fields ghi đè field header."""
+    tip = bc.tip()
+    b = Block(
+        fields.get("index", bc.height()),
+        fields.get("timestamp", tip.timestamp + STEP if tip else START),
+        payload() if data is None else data,
+        fields.get("previous_hash", tip.hash if tip else None),
+        bits=fields.get("bits", bc.next_bits()),
+    )
+    b.mine()
+    return b
+
+
+def grow(bc, n, miner="M", txs=lambda i: ()):
+    """Thêm n block (miner, txs(i)) vào bc, trả về bc."""
+    for i in range(n):
+        bc.appendBlock(next_block(bc, payload(txs(i), miner)))
+    return bc
+
+
+def copy_of(bc, height=None):
+    """Chuỗi mới gồm bản sao height block đầu của bc (để rẽ nhánh)."""
+    other = Blockchain()
+    for b in bc.chains[:height]:
+        other.appendBlock(Block.from_dict(b.to_dict()))
+    return other
@@ -0,0 +1,258 @@
+import json
+
+import pytest
+
+from block import MAX_BLOCK_SIZE, Block
+from blockchain import Blockchain
+from helpers import copy_of, grow, next_block, payload, tx
+from mempool import tx_id
+
+
+@pytest.fixture
+def main():
+    return grow(Blockchain(), 20, txs=lambda i: [tx("A", "B")])
+
+
+# ----- fork choice / reorg -----
+def test_heavier_fork_reorgs_and_rewinds_ledger(main):
+    old_tip = main.tip().hash
+    alt = grow(copy_of(main, 12), 10, miner="N", txs=lambda i: [tx("A", "C", 2.0)])
+
+    assert main.replace_chain(alt.to_list(12))
+    assert main.replaced_from == 12
+    assert main.tip().hash == alt.tip().hash
+    assert main.ledger.balances == alt.ledger.balances
+    # nhánh cũ vẫn trong tree, TX của phần bị bỏ không còn trong tx_index
+    assert old_tip in main.tree
+    assert not main.has_block(old_tip)
+    assert main.tx_index.keys() == alt.tx_index.keys()
+
+
+def test_lighter_fork_kept_as_side_branch(main):
+    tip = main.tip().hash
+    alt = grow(copy_of(main, 12), 3, miner="N")
+
+    assert not main.replace_chain(alt.to_list(12))
+    assert main.tip().hash == tip
+    assert alt.tip().hash in main.tree
+    assert main.fork_point(alt.tip().hash) == 11
+
+    # phần đuôi mới nối vào nhánh phụ đã biết → chỉ gửi block mới
+    grow(alt, 10, miner="N")
+    assert main.replace_chain(alt.to_list(15))
+    assert main.tip().hash == alt.tip().hash
+    assert main.ledger.balances == alt.ledger.balances
+
+
+def test_switch_back_to_original_branch(main):
+    original = copy_of(main)
+    alt = grow(copy_of(main, 15), 7, miner="N")
+    assert main.replace_chain(alt.to_list(15))
+
+    grow(original, 5)
+    assert main.replace_chain(original.to_list(20))
+    assert main.tip().hash == original.tip().hash
+    assert main.ledger.balances == original.ledger.balances
+    assert main.tx_index == original.tx_index
+
+
+def test_fork_that_overspends_is_discarded(main):
+    tip = main.tip().hash
+    alt = copy_of(main, 10)
+    alt.ledger.apply_block = lambda b: {}   # alt không kiểm tra số dư
+    grow(alt, 15, miner="N", txs=lambda i: [tx("A", "C", 90.0)])
+
+    assert not main.replace_chain(alt.to_list(10))
+    assert main.tip().hash == tip
+    assert main.ledger.balances == copy_of(main).ledger.balances
+    assert alt.chains[11].hash not in main.tree
+
+
+def test_tx_of_abandoned_branch_can_be_mined_again(main):
+    moved = main.chains[-1].transactions()[0]
+    alt = copy_of(main, 19)
+    grow(alt, 3, miner="N", txs=lambda i: [moved] if i == 0 else [])
+    assert main.replace_chain(alt.to_list(19))
+    assert main.has_tx(tx_id(moved))
+
+
+# ----- block kế tiếp phải nối đúng tip -----
+def test_append_rejects_wrong_index_or_link(main):
+    height, tip = main.height(), main.tip().hash
+    far = next_block(main, index=999)
+    assert not main.validate_next(far)
+    with pytest.raises(ValueError):
+        main.appendBlock(far)
+
+    stale = next_block(main, previous_hash=main.chains[5].hash)
+    assert not main.validate_next(stale)
+    with pytest.raises(ValueError):
+        main.appendBlock(stale)
+    assert (main.height(), main.tip().hash) == (height, tip)
+
+
+def test_wrong_bits_rejected(main):
+    b = next_block(main, bits=main.next_bits() - 1)
+    assert not main.validate_next(b)
+
+
+# ----- TX trùng / phát lại -----
+def test_replayed_tx_rejected(main):
+    old = main.chains[3].transactions()[0]
+    b = next_block(main, payload([old]))
+    assert not main.validate_next(b)
+    with pytest.raises(ValueError):
+        main.appendBlock(b)
+
+    ext = copy_of(main)
+    ext.appendBlock(next_block(ext, payload([tx()])))
+    ext.tx_index.clear()   # ext không biết TX cũ → đào lại được
+    ext.appendBlock(next_block(ext, payload([old])))
+    # block đầu hợp lệ được nhận, block phát lại TX cũ thì không
+    main.replace_chain(ext.to_list(20))
+    assert main.height() == 21
+    assert ext.tip().hash not in main.tree
+
+
+def test_duplicate_tx_in_block_rejected(main):
+    t = tx()
+    b = next_block(main, payload([t, t]))
+    assert not main.validate_next(b)
+    with pytest.raises(ValueError):
+        main.appendBlock(b)
+
+
+# ----- data chuẩn -----
+def test_non_canonical_data_rejected(main):
+    loose = json.dumps({"txs": [tx()], "miner": "M"})   # có khoảng trắng
+    assert not next_block(main, loose).data_ok()
+    assert not main.validate_next(next_block(main, loose))
+
+    both = payload([tx()])[:-1] + ',"tx":' + json.dumps(tx(), separators=(",", ":")) + "}"
+    assert not next_block(main, both).data_ok()
+
+    ext = copy_of(main)
+    ext.appendBlock(next_block(ext, loose))
+    assert not main.replace_chain(ext.to_list(20))
+
+    assert next_block(main, "hello").data_ok()
+
+
+def test_oversized_block_rejected(main):
+    b = next_block(main, "x" * MAX_BLOCK_SIZE)
+    assert not b.size_ok()
+    assert not main.validate_next(b)
+
+    ext = copy_of(main)
+    ext.appendBlock(b)
+    assert not main.replace_chain(ext.to_list(20))
+
+
+@pytest.mark.parametrize("field, value", [
+    ("index", "20"),
+    ("timestamp", "soon"),
+    ("bits", None),
+    ("nonce", -1),
+    ("nonce", 2 ** 64),
+    ("previous_hash", 5),
+    ("previous_hash", "zz"),
+    ("data", 5),
+    ("hash", ["x"]),
+])
+def test_malformed_fields_are_invalid(main, field, value):
+    bd = next_block(main, payload([tx()])).to_dict()
+    bd[field] = value
+    assert main.replace_chain([bd]) is False
+    assert main.height() == 20
+
+    try:
+        b = Block.from_dict(bd)
+    except (KeyError, TypeError, ValueError):
+        return
+    assert main.validate_next(b) is False
+
+
+def test_missing_field_is_invalid(main):
+    bd = next_block(main).to_dict()
+    del bd["previous_hash"]
+    assert main.replace_chain([bd]) is False
+
+
+# ----- lỗi khi đổi nhánh -----
+def test_disk_error_during_reorg_keeps_chain(tmp_path):
+    from blockstore import BlockStore
+
+    src = grow(Blockchain(), 3)
+    bc = Blockchain(store=BlockStore(str(tmp_path)))
+    for b in src.chains[:2]:
+        bc.appendBlock(b)
+    alt = grow(copy_of(src, 1), 3, miner="N", txs=lambda i: [tx("A", "C")])
+
+    def disk_full(height):
+        raise OSError("disk full")
+
+    truncate = bc.store.truncate
+    bc.store.truncate = disk_full
+    with pytest.raises(OSError):
+        bc.replace_chain(alt.to_list())
+    assert bc.tip().hash == src.chains[1].hash
+    assert len(bc.store) == 2
+    assert alt.tip().hash in bc.tree
+
+    bc.store.truncate = truncate
+    assert bc.replace_chain(alt.to_list())
+    assert bc.tip().hash == alt.tip().hash
+    assert len(bc.store) == 4
+    bc.store.close()
+
+
+def test_disk_error_while_applying_branch_keeps_chain(tmp_path):
+    from blockstore import BlockStore
+
+    src = grow(Blockchain(), 3)
+    bc = Blockchain(store=BlockStore(str(tmp_path)))
+    for b in src.chains[:2]:
+        bc.appendBlock(b)
+    alt = grow(copy_of(src, 1), 3, miner="N", txs=lambda i: [tx("A", "C")])
+
+    append, calls = bc.store.append, []
+
+    def flaky(block):
+        calls.append(block)
+        if len(calls) == 2:
+            raise OSError("io error")
+        return append(block)
+
+    bc.store.append = flaky
+    with pytest.raises(OSError):
+        bc.replace_chain(alt.to_list())
+    # lỗi đĩa không phải lỗi của block: quay lại chuỗi cũ, nhánh vẫn giữ để thử lại
+    assert bc.tip().hash == src.chains[1].hash
+    assert bc.ledger.balances == copy_of(src, 2).ledger.balances
+    assert len(bc.store) == 2
+    assert alt.tip().hash in bc.tree
+    bc.store.close()
+
+
+def test_unexpected_error_while_applying_discards_branch(main):
+    tip = main.tip().hash
+    alt = grow(copy_of(main, 5), 20, miner="N")
+    bad = alt.chains[8].hash
+    apply = main.ledger.apply_block
+
+    def boom(b):
+        if b.hash == bad:
+            raise TypeError("boom")
+        return apply(b)
+
+    main.ledger.apply_block = boom
+    assert not main.replace_chain(alt.to_list(5))
+    assert main.tip().hash == tip
+    assert bad not in main.tree
+    assert main.ledger.balances == copy_of(main).ledger.balances
+
+
+def test_next_bits_after_follows_branch(main):
+    assert main.next_bits_after(main.tip().hash) == main.next_bits()
+    assert main.next_bits_after(None) == Blockchain().next_bits()
+    assert main.next_bits_after("ff" * 32) is None
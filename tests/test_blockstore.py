@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+from block import Block
+from blockchain import Blockchain
+from blockstore import BlockStore
+from helpers import copy_of, grow, tx
+from snapshot import SNAPSHOT_FILE, Snapshot
+
+
+def persisted(path, src):
+    bc = Blockchain(store=BlockStore(path))
+    for b in src.chains:
+        bc.appendBlock(Block.from_dict(b.to_dict()))
+    bc.store.close()
+
+
+def test_reopen_restores_chain(tmp_path):
+    src = grow(Blockchain(), 30, txs=lambda i: [tx("A", "B")])
+    persisted(str(tmp_path), src)
+
+    bc = Blockchain(store=BlockStore(str(tmp_path)))
+    assert bc.height() == 30
+    assert bc.tip().hash == src.tip().hash
+    assert bc.ledger.balances == src.ledger.balances
+    assert bc.tx_index == src.tx_index
+    assert bc.store.read_block(7).hash == src.chains[7].hash
+    bc.store.close()
+
+
+def test_truncate_then_reopen(tmp_path):
+    src = grow(Blockchain(), 30)
+    persisted(str(tmp_path), src)
+
+    store = BlockStore(str(tmp_path))
+    store.truncate(12)
+    assert len(store) == 12
+    store.close()
+    bc = Blockchain(store=BlockStore(str(tmp_path)))
+    assert bc.tip().hash == src.chains[11].hash
+    bc.store.close()
+
+
+def test_reorg_is_persisted(tmp_path):
+    src = grow(Blockchain(), 20)
+    persisted(str(tmp_path), src)
+    bc = Blockchain(store=BlockStore(str(tmp_path)))
+    alt = grow(copy_of(src, 10), 15, miner="N", txs=lambda i: [tx("A", "C")])
+    assert bc.replace_chain(alt.to_list(10))
+    bc.store.close()
+
+    re = Blockchain(store=BlockStore(str(tmp_path)))
+    assert re.height() == 25
+    assert re.tip().hash == alt.tip().hash
+    assert re.ledger.balances == alt.ledger.balances
+    re.store.close()
+
+
+@pytest.fixture
+def checkpointed(tmp_path, small_checkpoints):
+    """Store 130 block, snapshot.dat tại checkpoint 100."""
+    src = grow(Blockchain(), 130, txs=lambda i: [tx("A", "B", 0.5)])
+    persisted(str(tmp_path), src)
+    return str(tmp_path), src
+
+
+def test_reopen_starts_from_snapshot_file(checkpointed):
+    path, src = checkpointed
+    assert Snapshot.load(os.path.join(path, SNAPSHOT_FILE)).height == 100
+
+    bc = Blockchain(store=BlockStore(path))
+    # số dư tới checkpoint lấy từ snapshot.dat, chỉ áp lại 30 block sau đó
+    assert bc.state_from == 100
+    assert bc.tip().hash == src.tip().hash
+    assert bc.ledger.balances == src.ledger.balances
+    assert bc.tree.best.work == src.tree.best.work
+    assert len(bc.tx_index) == 30
+
+    # reorg nông sau checkpoint vẫn theo được
+    alt = grow(copy_of(src, 120), 15, miner="N", txs=lambda i: [tx("A", "C")])
+    assert bc.replace_chain(alt.to_list(120))
+    assert bc.ledger.balances == alt.ledger.balances
+    bc.store.close()
+
+
+def test_reopen_without_snapshot_replays(checkpointed):
+    path, src = checkpointed
+    os.remove(os.path.join(path, SNAPSHOT_FILE))
+    bc = Blockchain(store=BlockStore(path))
+    assert bc.state_from == 0
+    assert bc.ledger.balances == src.ledger.balances
+    bc.store.close()
+
+
+def test_snapshot_not_matching_store_is_ignored(checkpointed):
+    path, src = checkpointed
+    other = grow(Blockchain(), 120, miner="X")
+    other.latest_snapshot().save(os.path.join(path, SNAPSHOT_FILE))
+
+    bc = Blockchain(store=BlockStore(path))
+    assert bc.state_from == 0
+    assert bc.ledger.balances == src.ledger.balances
+    bc.store.close()
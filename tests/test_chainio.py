@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+from blockchain import Blockchain
+from chainio import import_blocks, iter_chunks, iter_header_chunks
+from helpers import copy_of, grow, tx
+from peer_net import write_blocks
+from snapshot import Snapshot
+from test_peer_net import BufferWriter, all_blocks, chunks_of, read_with
+
+
+def test_chunks_respect_block_and_byte_limits():
+    src = grow(Blockchain(), 25)
+    parts = list(iter_chunks(src, 3, chunk=10))
+    assert [len(p.splitlines()) for p in parts] == [10, 10, 2]
+
+    line = len(next(src.iter_lines(0)))
+    parts = list(iter_chunks(src, 0, chunk=10, max_bytes=3 * line))
+    assert all(len(p) <= 3 * line for p in parts)
+    assert sum(len(p.splitlines()) for p in parts) == 25
+
+
+def test_largest_block_fits_one_frame():
+    from block import MAX_BLOCK_SIZE, tx_budget
+    from chainio import CHUNK_BYTES
+    from helpers import next_block, payload
+    from peer_net import MAX_FRAME_SIZE
+
+    bc = grow(Blockchain(), 1)
+    miner = "M"
+    message = "x" * (tx_budget(miner) - 200)
+    b = next_block(bc, payload([{"from": "A", "to": "B", "amount": 1.0, "message": message}], miner))
+    assert b.size_ok() and b.record_size() <= MAX_BLOCK_SIZE
+    bc.appendBlock(b)
+    part = list(iter_chunks(bc, 1))
+    assert len(part) == 1 and len(part[0]) <= CHUNK_BYTES <= MAX_FRAME_SIZE
+
+
+def test_import_in_chunks_resumes_from_side_branch():
+    src = grow(Blockchain(), 60, txs=lambda i: [tx()])
+    bc = copy_of(src)
+    alt = grow(copy_of(src, 20), 50, miner="N")
+    dicts = alt.to_list(20)
+
+    # chunk đầu chưa nặng hơn chuỗi chính nhưng được giữ trong tree
+    assert import_blocks(bc, dicts[:10], chunk=10) is None
+    assert import_blocks(Blockchain(), []) is None
+    assert import_blocks(bc, dicts[10:], chunk=10) == 20
+    assert bc.tip().hash == alt.tip().hash
+
+
+def test_header_stream_bootstraps_lagging_node(small_checkpoints):
+    full = grow(Blockchain(), 140, txs=lambda i: [tx("A", "B", 0.5)])
+    pruned = Blockchain(prune_depth=20)
+    pruned.replace_chain(full.to_list())
+    snap = pruned.latest_snapshot()
+    assert pruned.full_from == snap.height == 100
+
+    # peer tụt ở height 30: header 30..99 qua luồng frame, mỗi frame tối đa 16 header
+    headers = list(iter_header_chunks(pruned, 30, snap.height, chunk=16))
+    assert len(headers) == 5
+    writer = BufferWriter()
+    asyncio.run(write_blocks(writer, chunks_of(headers)))
+    received = [h for part in read_with(all_blocks, writer.data) for h in part]
+    assert [h["index"] for h in received] == list(range(30, 100))
+    assert all(h["data"] is None for h in received)
+
+    lag = copy_of(full, 30)
+    assert lag.load_snapshot(Snapshot.from_bytes(snap.to_bytes()), received)
+    assert lag.replace_chain(pruned.to_list(snap.height))
+    assert lag.tip().hash == full.tip().hash
+    assert lag.ledger.balances == full.ledger.balances
+
+    # header bị sửa / header-only qua replace_chain → không nhận
+    bad = [dict(h) for h in received]
+    bad[5]["nonce"] += 1
+    lag2 = copy_of(full, 30)
+    assert not lag2.load_snapshot(Snapshot.from_bytes(snap.to_bytes()), bad)
+    assert not lag2.replace_chain(received)
+    assert json.loads(next(pruned.iter_header_lines(0, 1)))["index"] == 0
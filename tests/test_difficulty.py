@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+from difficulty import (
+    INITIAL_BITS,
+    MAX_ADJUST,
+    MAX_FUTURE_DRIFT,
+    MAX_TARGET,
+    TARGET_BLOCK_TIME,
+    bits_to_target,
+    hash_meets_target,
+    next_bits,
+    target_to_bits,
+    timestamp_ok,
+)
+
+
+def headers(times, bits=INITIAL_BITS):
+    return [SimpleNamespace(timestamp=t, bits=bits) for t in times]
+
+
+def test_target_above_max_rejected():
+    # bits tự đặt dễ hơn mức dễ nhất: mọi hash đều "đạt" nếu chỉ so hash < target
+    assert bits_to_target(0x227FFFFF) > MAX_TARGET
+    assert not hash_meets_target("00" * 32, 0x227FFFFF)
+    easiest = target_to_bits(MAX_TARGET)
+    assert hash_meets_target("00" * 32, easiest)
+    assert not hash_meets_target(f"{MAX_TARGET:064x}", easiest)
+
+
+def test_retarget_clamped_to_max_adjust():
+    target = bits_to_target(INITIAL_BITS)
+    fast = next_bits(headers([i * 0.001 for i in range(11)]))
+    slow = next_bits(headers([i * 1000.0 for i in range(11)]))
+    steady = next_bits(headers([i * TARGET_BLOCK_TIME for i in range(11)]))
+    assert bits_to_target(fast) >= target // MAX_ADJUST - (target >> 20)
+    assert bits_to_target(slow) <= target * MAX_ADJUST
+    assert abs(bits_to_target(steady) - target) <= target >> 20
+    assert bits_to_target(next_bits(headers([i * 1e6 for i in range(11)], target_to_bits(MAX_TARGET)))) == MAX_TARGET
+
+
+def test_timestamp_after_median_and_not_in_future():
+    recent = headers([100.0, 200.0, 300.0])
+    assert timestamp_ok(201.0, recent, now=1000.0)
+    assert not timestamp_ok(200.0, recent, now=1000.0)
+    assert not timestamp_ok(1000.0 + MAX_FUTURE_DRIFT + 1, recent, now=1000.0)
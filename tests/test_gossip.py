@@ -0,0 +1,20 @@
+from gossip import GOSSIP_FANOUT, SeenCache, pick_relays
+
+
+def test_pick_relays_bounded_and_excludes():
+    peers = [((f"10.0.0.{i}", 5000), f"N{i}") for i in range(20)]
+    relays = pick_relays(peers, exclude={("10.0.0.3", 5000)})
+    assert len(relays) == GOSSIP_FANOUT
+    assert len(set(relays)) == len(relays)
+    assert (("10.0.0.3", 5000), "N3") not in relays
+
+    few = peers[:3]
+    assert pick_relays(few, fanout=5, exclude={few[0][0]}) == few[1:]
+
+
+def test_seen_cache_drops_oldest():
+    seen = SeenCache(size=2)
+    assert seen.add("a") and seen.add("b")
+    assert not seen.add("a")      # bản trùng, "a" thành mới nhất
+    assert seen.add("c")          # đẩy "b" ra
+    assert "a" in seen and "b" not in seen
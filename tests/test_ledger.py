@@ -0,0 +1,64 @@
+import pytest
+
+from block import Block
+from helpers import payload
+from ledger import INITIAL_BALANCE, Ledger
+from merkle import encode_leaf
+
+
+def block(txs, miner="M"):
+    return Block(1, 0.0, payload(txs, miner), None)
+
+
+def test_revert_restores_balances():
+    ledger = Ledger()
+    first = ledger.apply_block(block([{"from": "A", "to": "B", "amount": 30.0, "message": "hi"}]))
+    before = dict(ledger.balances)
+    second = ledger.apply_block(block([{"from": "B", "to": "C", "amount": 100.0}], miner="N"))
+    assert ledger.balance("C") == INITIAL_BALANCE + 100.0
+
+    ledger.revert_block(second)
+    assert ledger.balances == before
+    ledger.revert_block(first)
+    # tài khoản chưa từng có trước block bị bỏ hẳn, không để lại số dư mặc định
+    assert ledger.balances == {}
+
+
+def test_overspend_raises_and_keeps_balances():
+    ledger = Ledger()
+    ledger.apply_block(block([{"from": "A", "to": "B", "amount": 60.0}]))
+    before = dict(ledger.balances)
+    b = block([{"from": "A", "to": "C", "amount": 60.0}])
+    assert not ledger.check_block(b)
+    with pytest.raises(ValueError):
+        ledger.apply_block(b)
+    assert ledger.balances == before
+
+
+@pytest.mark.parametrize("tx", [
+    {"from": "A", "to": "B", "amount": float("nan")},
+    {"from": "A", "to": "B", "amount": "inf"},
+    {"from": "A", "to": "B", "amount": -1},
+    {"from": ["A"], "to": "B", "amount": 1},
+    {"to": "B", "amount": 1},
+    1,
+])
+def test_malformed_tx_rejected(tx):
+    assert not Ledger().check_block(block([tx]))
+
+
+def test_select_txs_respects_balance_limit_and_size():
+    ledger = Ledger()
+    txs = [
+        {"from": "A", "to": "B", "amount": 60.0},
+        {"from": "A", "to": "B", "amount": 60.0},   # A hết tiền
+        {"from": "B", "to": "C", "amount": 150.0},  # chỉ đủ nhờ TX đầu
+        {"from": "C", "to": "A", "amount": 1.0},
+    ]
+    assert ledger.select_txs(txs, 10) == [txs[0], txs[2], txs[3]]
+    assert ledger.select_txs(txs, 2) == [txs[0], txs[2]]
+
+    big = {"from": "A", "to": "B", "amount": 1.0, "message": "x" * 500}
+    small = {"from": "C", "to": "D", "amount": 1.0}
+    budget = len(encode_leaf(small)) + 1
+    assert ledger.select_txs([big, small], 10, max_bytes=budget) == [small]
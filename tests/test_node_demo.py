@@ -0,0 +1,57 @@
+# PeerNode cần tkinter; chỉ test các kiểm tra không đụng tới GUI / mạng.
+from types import SimpleNamespace
+
+import pytest
+
+from block import Block
+from blockchain import Blockchain
+from helpers import copy_of, grow, next_block, payload
+
+pytest.importorskip("tkinter")
+from node_demo import PeerNode  # noqa: E402
+
+
+def proposal(block):
+    return {"type": "BLOCK_PROPOSAL", "block": block.to_dict(), "block_hash": block.hash}
+
+
+@pytest.fixture
+def node():
+    return SimpleNamespace(blockchain=grow(Blockchain(), 15))
+
+
+def test_relay_ok_accepts_proposal_on_known_parent(node):
+    assert PeerNode.relay_ok(node, proposal(next_block(node.blockchain)))
+    # nhánh phụ từ block đã biết cũng được chuyển tiếp
+    side = copy_of(node.blockchain, 10)
+    assert PeerNode.relay_ok(node, proposal(next_block(side)))
+    assert PeerNode.relay_ok(node, {"type": "NEW_TX", "tx": {}})
+
+
+def test_relay_ok_rejects_bogus_proposals(node):
+    bc = node.blockchain
+    # target > 2^256: mọi hash đều nhỏ hơn, không cần đào
+    tip = bc.tip()
+    easy = Block(bc.height(), tip.timestamp + 1, payload(), tip.hash, bits=0x227FFFFF)
+    assert not PeerNode.relay_ok(node, proposal(easy))
+    assert not PeerNode.relay_ok(node, proposal(next_block(bc, bits=bc.next_bits() + 1)))
+    assert not PeerNode.relay_ok(node, proposal(next_block(bc, previous_hash="ab" * 32)))
+
+    msg = proposal(next_block(bc))
+    msg["block_hash"] = "00" * 32
+    assert not PeerNode.relay_ok(node, msg)
+    msg = proposal(next_block(bc))
+    del msg["block"]["nonce"]
+    assert not PeerNode.relay_ok(node, msg)
+
+
+def test_vote_repair_targets_only_missing_voters():
+    peers = [(("10.0.0.1", 5001), "A"), (("10.0.0.2", 5002), "B"), (("10.0.0.3", 5003), "C")]
+    node = SimpleNamespace(
+        current_block_hash="h1",
+        block_votes={"h1": {"10.0.0.9:5009", "10.0.0.2:5002"}},
+        _peer_items=lambda: peers,
+    )
+    assert PeerNode._missing_voters(node, "h1") == [peers[0], peers[2]]
+    # round đã xong (block khác / đã commit) → không gửi lại
+    assert PeerNode._missing_voters(node, "h0") == []
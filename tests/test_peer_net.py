@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from peer_net import (
+    FRAME_BLOCKS,
+    FRAME_HEADER,
+    FRAME_PING,
+    MAX_FRAME_SIZE,
+    encode_frame,
+    encode_message,
+    read_blocks,
+    read_frame,
+    read_message,
+    write_blocks,
+)
+
+
+class BufferWriter:
+    """Writer giả: gom byte đã ghi (thay cho StreamWriter)."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+
+def read_with(fn, data, eof=True):
+    """Chạy fn(reader) (coroutine) trên StreamReader chứa sẵn `data`."""
+    async def go():
+        reader = asyncio.StreamReader()
+        reader.feed_data(bytes(data))
+        if eof:
+            reader.feed_eof()
+        return await fn(reader)
+    return asyncio.run(go())
+
+
+async def chunks_of(parts):
+    for part in parts:
+        yield part
+
+
+async def all_blocks(reader):
+    return [part async for part in read_blocks(reader)]
+
+
+def test_message_roundtrip_skips_ping():
+    data = encode_frame(FRAME_PING) + encode_message({"type": "HELLO", "n": 1})
+
+    async def twice(reader):
+        return await read_message(reader), await read_message(reader)
+
+    assert read_with(twice, data) == ({"type": "HELLO", "n": 1}, None)
+
+
+def test_block_stream_roundtrip():
+    parts = [b'{"index": 0}\n{"index": 1}\n', b'{"index": 2}\n']
+    writer = BufferWriter()
+    asyncio.run(write_blocks(writer, chunks_of(parts)))
+    got = read_with(all_blocks, writer.data)
+    assert got == [[{"index": 0}, {"index": 1}], [{"index": 2}]]
+
+
+def test_cut_stream_raises():
+    data = encode_frame(FRAME_BLOCKS, b'{"index": 0}\n')
+    with pytest.raises(ConnectionError):
+        read_with(all_blocks, data)
+
+    # kết nối đóng giữa 1 frame
+    with pytest.raises(asyncio.IncompleteReadError):
+        read_with(read_frame, encode_message({"type": "X"})[:-2])
+
+
+def test_oversized_or_unexpected_frame_rejected():
+    huge = FRAME_HEADER.pack(FRAME_BLOCKS, MAX_FRAME_SIZE + 1)
+    with pytest.raises(ValueError):
+        read_with(read_frame, huge, eof=False)
+
+    with pytest.raises(ValueError):
+        read_with(read_message, encode_frame(FRAME_BLOCKS, b""))
+    with pytest.raises(ValueError):
+        read_with(all_blocks, encode_message({"type": "X"}))
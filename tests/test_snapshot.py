@@ -0,0 +1,60 @@
+import pytest
+
+from blockchain import Blockchain
+from helpers import grow, tx
+from snapshot import Snapshot
+
+
+@pytest.fixture
+def src(small_checkpoints):
+    return grow(Blockchain(), 137, txs=lambda i: [tx("A", "B", 0.5)])
+
+
+def test_bytes_roundtrip(src):
+    snap = src.latest_snapshot()
+    assert snap.height == 100
+    back = Snapshot.from_bytes(snap.to_bytes())
+    assert back.verify()
+    assert back.tip().hash == src.get_by_height(99).hash
+    assert back.work == snap.work
+    assert back.balances == snap.balances
+
+
+def test_corrupt_snapshot_rejected(src):
+    raw = bytearray(src.latest_snapshot().to_bytes())
+    with pytest.raises(ValueError):
+        Snapshot.from_bytes(bytes(raw[:-3]))
+    raw[0] ^= 1
+    with pytest.raises(ValueError):
+        Snapshot.from_bytes(bytes(raw))
+
+    snap = Snapshot.from_bytes(src.latest_snapshot().to_bytes())
+    snap.headers[3].nonce += 1
+    snap.headers[3].hash = None
+    assert not snap.verify()
+
+
+def test_bootstrap_from_snapshot(src):
+    snap = Snapshot.from_bytes(src.latest_snapshot().to_bytes())
+    bc = Blockchain()
+    assert bc.load_snapshot(snap)
+    assert (bc.base, bc.full_from, bc.height()) == (89, 100, 100)
+
+    assert bc.replace_chain(src.to_list(snap.height))
+    assert bc.tip().hash == src.tip().hash
+    assert bc.ledger.balances == src.ledger.balances
+    # block trước checkpoint không có data → không xuất
+    assert bc.to_list()[0]["index"] == 100
+
+
+def test_inflated_work_does_not_block_honest_chain(src):
+    evil = Snapshot.from_bytes(src.latest_snapshot().to_bytes())
+    evil.work *= 10 ** 6
+    bc = Blockchain()
+    assert bc.load_snapshot(evil)
+    bc.replace_chain(src.to_list(evil.height))
+
+    honest = grow(Blockchain(), 170, miner="H")
+    assert bc.replace_chain(honest.to_list())
+    assert bc.tip().hash == honest.tip().hash
+    assert bc.ledger.balances == honest.ledger.balances
@@ -0,0 +1,48 @@
+import pytest
+
+import validation
+from blockchain import Blockchain
+from helpers import grow
+
+
+@pytest.fixture(scope="module")
+def dicts():
+    return grow(Blockchain(), 40).to_list()
+
+
+def test_serial_and_parallel_agree(dicts, monkeypatch):
+    serial = validation.validate_blocks(dicts)
+    assert [b.hash for b in serial] == [d["hash"] for d in dicts]
+
+    monkeypatch.setattr(validation, "default_workers", lambda: 2)
+    monkeypatch.setattr(validation, "PARALLEL_THRESHOLD", 5)
+    monkeypatch.setattr(validation, "MIN_TASK_BLOCKS", 7)
+    parallel = validation.validate_blocks(dicts)
+    assert [b.hash for b in parallel] == [b.hash for b in serial]
+
+    bad = [dict(d) for d in dicts]
+    bad[33]["data"] = "tampered"
+    assert validation.validate_blocks(bad) is None
+
+
+def test_check_chunk_reports_first_bad_block(dicts):
+    bad = [dict(d) for d in dicts[:5]]
+    bad[2]["timestamp"] = "x"
+    bad[3]["data"] = "tampered"
+    assert validation.check_chunk(bad) == 2
+    assert len(validation.check_chunk(dicts[:5])) == 5
+
+
+def test_broken_linkage_rejected(dicts):
+    swapped = dicts[:10] + [dicts[11], dicts[10]] + dicts[12:]
+    assert validation.validate_blocks(swapped) is None
+    assert validation.validate_blocks(dicts[5:]) is None      # thiếu block cha
+    assert validation.validate_blocks(dicts[5:], parent=None) is None
+
+
+def test_sync_chunk_can_run_in_parallel():
+    import chainio
+
+    # chunk sync nhỏ hơn ngưỡng thì không bao giờ được kiểm tra song song
+    assert validation.PARALLEL_THRESHOLD <= chainio.CHUNK_BLOCKS
+    assert validation.PARALLEL_THRESHOLD >= 2 * validation.MIN_TASK_BLOCKS